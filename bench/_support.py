@@ -0,0 +1,34 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+# общий с локальным воркером загрузчик функций — в src/common/stages.py
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common import stages
+
+FAKE_ENV = {
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'BUCKET_NAME': 'bench-bucket',
+    'TABLE_NAME': 'bench-tasks',
+    'YDB_ENDPOINT': 'grpc://localhost:2136',
+    'YDB_DATABASE': '/local',
+    'QUEUE': 'https://localhost/queue',
+    'CUR_QUEUE': 'https://localhost/cur-queue',
+    'NEXT_QUEUE': 'https://localhost/next-queue',
+    'RECOGNIZE_QUEUE': 'https://localhost/recognize-queue',
+    'GENERATE_QUEUE': 'https://localhost/generate-queue',
+    'RECOGNITION_STATS_TABLE': 'bench-recognition-stats',
+    'TASK_SPANS_TABLE': 'bench-task-spans',
+    'FOLDER_ID': 'bench-folder',
+    'API_KEY': 'bench',
+}
+
+
+def load_function(name, env=None):
+    for key, value in FAKE_ENV.items():
+        os.environ.setdefault(key, value)
+    return stages.load_function(name, env)
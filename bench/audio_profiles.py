@@ -0,0 +1,98 @@
+# Размер и время кодирования аудио в профилях extract_audio (common/audio.py) на лекциях.
+# Каждый профиль кодируется как в функции — тем же набором аргументов ffmpeg, но в локальный файл,
+# отдельно без фильтров, с сокращением пауз и с сокращением пауз и нормализацией громкости.
+# Без файлов на входе генерируется синтетическая «лекция»: стерео 44.1 кГц с паузами каждые 15 секунд.
+# Запуск: python bench/audio_profiles.py [лекция.mp4 ...] [--seconds 600]; нужны ffmpeg и ffprobe в PATH
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from _support import SRC
+
+sys.path.insert(0, SRC)
+from common import audio  # noqa: E402
+
+VARIANTS = [
+    ('plain', False, False),
+    ('trim', True, False),
+    ('trim+loudnorm', True, True),
+]
+
+
+def make_lecture(path, seconds):
+    # тон с амплитудной модуляцией вместо речи и 5 секунд тишины из каждых 15
+    expression = '0.3*sin(2*PI*220*t)*(0.6+0.4*sin(2*PI*3*t))*gt(mod(t,15),5)'
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'aevalsrc={expression}|{expression}:s=44100:d={seconds}',
+        '-f', 'lavfi', '-i', f'color=c=black:s=320x240:r=5:d={seconds}',
+        '-shortest', '-c:v', 'mpeg4', '-c:a', 'aac', '-b:a', '128k',
+        path,
+    ], check=True)
+
+
+def probe_duration(path, profile):
+    # у сырого PCM нет заголовка, длительность считается по размеру
+    if profile == 'lpcm16k':
+        return os.path.getsize(path) / (16000 * 2)
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', path],
+        capture_output=True, text=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def encode(source, target, profile, trim_silence, loudnorm):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-i', source] + audio.encode_args(profile, trim_silence, loudnorm) + [target],
+        check=True
+    )
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return elapsed, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lectures', nargs='*')
+    parser.add_argument('--seconds', type=int, default=600)
+    parser.add_argument('--profiles', nargs='*', default=list(audio.PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lectures = args.lectures
+        if not lectures:
+            path = os.path.join(tmp, 'lecture.mp4')
+            make_lecture(path, args.seconds)
+            lectures = [path]
+
+        print(f"{'lecture':<20}{'profile':<10}{'variant':<15}{'size MB':>9}{'kbit/s':>8}{'audio s':>9}{'wall s':>8}{'cpu s':>7}{'x rt':>7}")
+        for lecture in lectures:
+            source_duration = probe_duration(lecture, None) or 0
+            for profile in args.profiles:
+                for variant, trim_silence, loudnorm in VARIANTS:
+                    target = os.path.join(tmp, f'out.{audio.PROFILES[profile]["format"]}')
+                    elapsed, cpu = encode(lecture, target, profile, trim_silence, loudnorm)
+                    size = os.path.getsize(target)
+                    duration = probe_duration(target, profile) or 0
+                    bitrate = size * 8 / 1000 / duration if duration else 0
+                    speed = source_duration / elapsed if elapsed else 0
+                    print(
+                        f"{os.path.basename(lecture)[:19]:<20}{profile:<10}{variant:<15}"
+                        f"{size / 1e6:>9.2f}{bitrate:>8.1f}{duration:>9.1f}{elapsed:>8.2f}{cpu:>7.2f}{speed:>7.0f}"
+                    )
+                    os.remove(target)
+
+
+if __name__ == '__main__':
+    main()
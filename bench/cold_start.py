@@ -0,0 +1,114 @@
+# Холодный старт функций: каждый замер — новый процесс интерпретатора, как новый контейнер.
+# Меряется время импорта main и первого вызова обработчика на дешёвом пути (ошибка валидации,
+# пустой батч), какие тяжёлые SDK к этому моменту загружены и какие модули дороже всего импортировать.
+# Запуск: pip install -r src/<функция>/requirements.txt && python bench/cold_start.py [--runs 20] [функция ...]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from _support import FAKE_ENV, SRC
+
+# дешёвые события: ответ без обращения к YDB, Object Storage и внешним API
+PROBES = {
+    'create': {'body': ''},
+    'tasks': {'queryStringParameters': {'id': 'bench'}},
+    'download_lecture': {'messages': []},
+    'extract_audio': {'messages': []},
+    'recognize_audio': {'messages': []},
+    'generate_pdf': {'messages': []},
+    'error': {'messages': []},
+}
+
+HEAVY_MODULES = ['ydb', 'boto3', 'botocore', 'requests', 'aiohttp', 'reportlab', 'grpc']
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.handler(json.loads(sys.argv[1]), None)
+handled = time.perf_counter()
+print(json.dumps({{
+    'import': imported - started,
+    'handler': handled - imported,
+    'loaded': [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_once(function, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE, json.dumps(PROBES[function])]
+    env = {**os.environ, **FAKE_ENV, 'PYTHONDONTWRITEBYTECODE': '1'}
+
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=os.path.join(SRC, function), env=env, capture_output=True, text=True)
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed')
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data['total'] = total
+    return data, result.stderr
+
+
+def top_imports(stderr, count):
+    # строки -X importtime: "import time: self | cumulative | имя", вложенность — отступом имени;
+    # берём модули, которые импортирует сам main, с временем вместе с их зависимостями
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('functions', nargs='*', default=list(PROBES))
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'function':<18}{'total p50':>10}{'total p95':>10}{'import p50':>11}{'handler p50':>12}  loaded after probe")
+    details = {}
+    for function in args.functions:
+        try:
+            # первый прогон прогревает кэш страниц ОС, в статистику не идёт
+            run_once(function)
+            samples = [run_once(function)[0] for _ in range(args.runs)]
+            _, stderr = run_once(function, importtime=True)
+        except RuntimeError as e:
+            print(f"{function:<18}error: {e}")
+            continue
+
+        totals = [sample['total'] * 1000 for sample in samples]
+        imports = [sample['import'] * 1000 for sample in samples]
+        handlers = [sample['handler'] * 1000 for sample in samples]
+        print(
+            f"{function:<18}{statistics.median(totals):>8.0f}ms{percentile(totals, 0.95):>8.0f}ms"
+            f"{statistics.median(imports):>9.0f}ms{statistics.median(handlers):>10.1f}ms"
+            f"  {', '.join(samples[-1]['loaded']) or '-'}"
+        )
+        details[function] = top_imports(stderr, args.top)
+
+    print()
+    for function, modules in details.items():
+        print(f"{function}: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for seconds, name in modules))
+
+
+if __name__ == '__main__':
+    main()
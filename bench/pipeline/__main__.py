@@ -0,0 +1,246 @@
+# Сквозной прогон конвейера create → download_lecture → extract_audio → recognize_audio → generate_pdf
+# на локальных заменах облака: moto вместо Object Storage и Message Queue, локальная YDB,
+# заменители Диска, SpeechKit и YandexGPT из fakes.py. Печатает по каждому этапу число вызовов,
+# пропускную способность, p50/p95 времени обработчика и ожидания в очереди.
+#
+# Запуск:
+#   docker run -d --rm -p 2136:2136 -e YDB_USE_IN_MEMORY_PDISKS=true ydbplatform/local-ydb
+#   pip install "moto[server]" -r src/download_lecture/requirements.txt \
+#       -r src/recognize_audio/requirements.txt -r src/generate_pdf/requirements.txt
+#   python bench/pipeline --lectures 20
+#   python bench/pipeline --lectures 20 --fused   # download_lecture сам извлекает аудио, extract_audio простаивает
+# ffmpeg и ffprobe должны быть в PATH: ими делается синтетическое видео и их вызывает extract_audio.
+import argparse
+import math
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlencode
+
+BENCH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BENCH not in sys.path:
+    sys.path.insert(0, BENCH)
+
+from _support import SRC, load_function
+from fakes import FakeCloud
+from stages import STAGES, serve
+import schema
+
+VISIBILITY_TIMEOUT = 60
+STATUS_POLL_SECONDS = 2
+JOIN_TIMEOUT = 30
+
+
+def make_video(seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'lecture.mp4')
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+            '-f', 'lavfi', '-i', f'color=c=black:s=320x240:r=5:d={seconds}',
+            '-shortest', '-c:v', 'mpeg4', '-c:a', 'aac', '-movflags', '+faststart',
+            path,
+        ], check=True)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def fmt(value, scale=1.0, digits=1):
+    return '-' if value is None else f'{value * scale:.{digits}f}'
+
+
+def drain(results, invocations):
+    while True:
+        try:
+            invocations.append(results.get_nowait())
+        except queue.Empty:
+            return
+
+
+def finished_count(runtime, table):
+    query = f"""
+        SELECT status, COUNT(*) AS count
+        FROM `{table}`
+        WHERE status IN ('успешно', 'ошибка')
+        GROUP BY status;
+    """
+    return {row['status']: row['count'] for row in runtime.execute(query)[0].rows}
+
+
+def report(invocations, fake, statuses, lectures, wall):
+    by_stage = defaultdict(list)
+    for invocation in invocations:
+        by_stage[invocation['stage']].append(invocation)
+
+    print(f"\n{lectures} lectures in {wall:.1f} s: "
+          + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    print(f"{'stage':<18} {'calls':>6} {'msgs':>6} {'failed':>6} {'msg/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'wait p50 s':>11} {'wait p95 s':>11}")
+    for function in ['create'] + [stage[0] for stage in STAGES]:
+        calls = by_stage.get(function, [])
+        if not calls:
+            continue
+        messages = sum(len(call['messages']) for call in calls)
+        window = max(call['finished_at'] for call in calls) - min(call['started_at'] for call in calls)
+        elapsed = [call['elapsed'] for call in calls]
+        waits = [m['wait'] for call in calls for m in call['messages'] if m['wait'] is not None]
+        print(f"{function:<18} {len(calls):>6} {messages:>6} {sum(call['failed'] for call in calls):>6} "
+              f"{fmt(messages / window if window > 0 else None):>7} "
+              f"{fmt(percentile(elapsed, 50), 1000):>8} {fmt(percentile(elapsed, 95), 1000):>8} "
+              f"{fmt(percentile(waits, 50)):>11} {fmt(percentile(waits, 95)):>11}")
+
+    # сквозное время — от создания задания до конца вызова generate_pdf, сделавшего PDF
+    total = [
+        call['finished_at'] - m['created_at']
+        for call in by_stage.get('generate_pdf', [])
+        for m in call['messages'] if m['created_at'] is not None
+    ]
+    print(f"\nend-to-end p50 {fmt(percentile(total, 50))} s, p95 {fmt(percentile(total, 95))} s")
+    print("external calls: " + ", ".join(f"{name} {count}" for name, count in sorted(fake.calls.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lectures', type=int, default=10)
+    parser.add_argument('--video-seconds', type=int, default=120)
+    parser.add_argument('--segment-seconds', type=int, default=1200)
+    parser.add_argument('--stt-delay', type=float, default=5.0, help='через сколько секунд SpeechKit «распознаёт» часть')
+    parser.add_argument('--llm-delay', type=float, default=0.5)
+    parser.add_argument('--batch-size', type=int, default=10)
+    # квоты общего лимитера SpeechKit; по умолчанию заведомо выше нагрузки прогона
+    parser.add_argument('--stt-rate', type=float, default=50)
+    parser.add_argument('--stt-in-flight', type=int, default=200)
+    parser.add_argument('--fused', action='store_true', help='совмещённый режим download_lecture (FUSED_MODE)')
+    parser.add_argument('--timeout', type=float, default=900)
+    parser.add_argument('--ydb-endpoint', default='grpc://localhost:2136')
+    parser.add_argument('--ydb-database', default='/local')
+    parser.add_argument('--keep-tables', action='store_true')
+    args = parser.parse_args()
+
+    # moto не знает регион ru-central1, который передают функции
+    os.environ['MOTO_ALLOW_NONEXISTENT_REGION'] = 'true'
+    from moto.server import ThreadedMotoServer
+
+    run = uuid.uuid4().hex[:8]
+    video = make_video(args.video_seconds)
+
+    moto = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+    moto.start()
+    fake = FakeCloud(video, stt_delay=args.stt_delay, llm_delay=args.llm_delay).start()
+    moto_host, moto_port = moto._server.server_address[:2]
+    moto_url = f'http://{moto_host}:{moto_port}'
+
+    os.environ.update({
+        'S3_ENDPOINT': moto_url,
+        'SQS_ENDPOINT': moto_url,
+        'DISK_API_URL': fake.url,
+        'STT_API_URL': fake.url,
+        'OPERATION_API_URL': fake.url,
+        'LLM_API_URL': fake.url,
+        'YDB_ENDPOINT': args.ydb_endpoint,
+        'YDB_DATABASE': args.ydb_database,
+        'YDB_ANONYMOUS_CREDENTIALS': '1',
+        'BUCKET_NAME': f'bench-{run}',
+        'SEGMENT_SECONDS': str(args.segment_seconds),
+        'STT_RATE': str(args.stt_rate),
+        'STT_BURST': str(args.stt_rate),
+        'STT_MAX_IN_FLIGHT': str(args.stt_in_flight),
+        'FUSED_MODE': 'true' if args.fused else '',
+    })
+    # адреса сервисов читаются при импорте, поэтому common импортируется после настройки окружения
+    sys.path.insert(0, SRC)
+    from common import runtime
+
+    runtime.s3().create_bucket(
+        Bucket=os.environ['BUCKET_NAME'],
+        CreateBucketConfiguration={'LocationConstraint': runtime.REGION},
+    )
+    queues = {
+        name: runtime.sqs().create_queue(
+            QueueName=f'bench-{run}-{name}',
+            Attributes={'VisibilityTimeout': str(VISIBILITY_TIMEOUT)},
+        )['QueueUrl']
+        for name in ('download', 'extract', 'recognize', 'generate', 'dlq')
+    }
+    tables = schema.create_tables(runtime, f'bench/{run}')
+    os.environ.update(tables)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    stop = context.Event()
+    workers = []
+    for function, source, queue_env in STAGES:
+        env = {key: queues[name] for key, name in queue_env.items()}
+        worker = context.Process(
+            target=serve,
+            args=(function, queues[source], env, args.batch_size, results, stop),
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+
+    invocations = []
+    statuses = {}
+    started = time.time()
+    try:
+        create = load_function('create', {
+            'QUEUE': queues['download'],
+            'RECOGNIZE_QUEUE': queues['recognize'],
+            'GENERATE_QUEUE': queues['generate'],
+        })
+        for i in range(args.lectures):
+            body = urlencode({'name': f'Лекция {i + 1}', 'url': f'https://disk.yandex.ru/i/bench-{run}-{i}'})
+            call_started, perf_started = time.time(), time.perf_counter()
+            response = create.handler({'body': body}, None)
+            invocations.append({
+                'stage': 'create',
+                'started_at': call_started,
+                'finished_at': time.time(),
+                'elapsed': time.perf_counter() - perf_started,
+                'failed': 0 if response['statusCode'] == 302 else 1,
+                'messages': [{'id': None, 'created_at': None, 'wait': None}],
+            })
+
+        while time.time() - started < args.timeout:
+            drain(results, invocations)
+            statuses = finished_count(runtime, tables['TABLE_NAME'])
+            if sum(statuses.values()) >= args.lectures:
+                break
+            time.sleep(STATUS_POLL_SECONDS)
+        else:
+            print(f"timeout: finished {sum(statuses.values())} of {args.lectures}")
+        wall = time.time() - started
+    finally:
+        stop.set()
+        # очередь результатов разбираем до join, иначе процесс может не завершиться, пока она не пуста
+        deadline = time.time() + JOIN_TIMEOUT
+        while any(worker.is_alive() for worker in workers) and time.time() < deadline:
+            drain(results, invocations)
+            time.sleep(0.1)
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        drain(results, invocations)
+        if not args.keep_tables:
+            schema.drop_tables(runtime, tables)
+        fake.stop()
+        moto.stop()
+
+    report(invocations, fake, statuses, args.lectures, wall)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# Локальные заменители внешних HTTP API: публичные ресурсы Яндекс Диска,
+# SpeechKit (распознавание и Operation API) и YandexGPT для объединения конспектов.
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+SUMMARY = {
+    "Тема лекции": "Синтетическая лекция для бенчмарка",
+    "Основные разделы": {
+        "Определения": ["Термин — короткое определение.", "Ещё один термин — пояснение (пример)."],
+        "Ключевые идеи": ["Первая идея лекции.", "Вторая идея лекции.", "Третья идея лекции."],
+    },
+    "Выводы": "Конспект сгенерирован заменителем SpeechKit.",
+}
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class FakeCloud:
+    def __init__(self, video, stt_delay=5.0, llm_delay=0.5):
+        self.video = video
+        self.stt_delay = stt_delay
+        self.llm_delay = llm_delay
+        self.calls = Counter()
+        self.operations = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self, 'GET')
+
+            def do_HEAD(self):
+                fake.handle(self, 'HEAD')
+
+            def do_POST(self):
+                fake.handle(self, 'POST')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def handle(self, request, method):
+        url = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = None
+        if method == 'POST':
+            length = int(request.headers.get('Content-Length') or 0)
+            body = json.loads(request.rfile.read(length) or b'{}')
+
+        if url.path == '/v1/disk/public/resources':
+            self.count('disk.resources')
+            return self.json(request, self.resource(query['public_key']))
+        if url.path == '/v1/disk/public/resources/download':
+            self.count('disk.download')
+            return self.json(request, {'href': f"{self.url}/files/{quote(query['public_key'], safe='')}"})
+        if url.path.startswith('/files/'):
+            self.count('disk.file')
+            return self.file(request, method)
+        if url.path == '/stt/v3/recognizeFileAsync':
+            self.count('stt.recognize')
+            return self.json(request, self.start_operation())
+        if url.path.startswith('/operations/'):
+            self.count('operation.get')
+            operation = self.operation(url.path.rsplit('/', 1)[-1])
+            return self.json(request, operation) if operation else self.json(request, {}, 404)
+        if url.path == '/stt/v3/getRecognition':
+            self.count('stt.result')
+            return self.recognition(request, query['operationId'])
+        if url.path == '/foundationModels/v1/completion':
+            self.count('llm.completion')
+            time.sleep(self.llm_delay)
+            text = json.dumps(SUMMARY, ensure_ascii=False)
+            return self.json(request, {'result': {'alternatives': [{'message': {'role': 'assistant', 'text': text}}]}})
+        self.json(request, {'error': f'unknown path {url.path}'}, 404)
+
+    def resource(self, public_key):
+        # у каждой ссылки своё «содержимое», иначе дедупликация склеит все лекции в одну
+        digest = hashlib.sha256(public_key.encode('utf-8')).hexdigest()
+        return {
+            'type': 'file',
+            'mime_type': 'video/mp4',
+            'path': f"/{unquote(public_key).rsplit('/', 1)[-1]}.mp4",
+            'size': len(self.video),
+            'md5': digest[:32],
+            'sha256': digest,
+        }
+
+    def start_operation(self):
+        operation_id = uuid.uuid4().hex
+        with self._lock:
+            self.operations[operation_id] = time.time()
+        return {'id': operation_id, 'done': False}
+
+    def operation(self, operation_id):
+        with self._lock:
+            created_at = self.operations.get(operation_id)
+        if created_at is None:
+            return None
+        finished_at = created_at + self.stt_delay
+        done = time.time() >= finished_at
+        return {
+            'id': operation_id,
+            'done': done,
+            'createdAt': iso(created_at),
+            'modifiedAt': iso(finished_at if done else time.time()),
+        }
+
+    def recognition(self, request, operation_id):
+        operation = self.operation(operation_id)
+        if not operation or not operation['done']:
+            return self.json(request, {'error': 'not ready'}, 404)
+        line = {
+            'result': {
+                'summarization': {
+                    'results': [{'response': json.dumps(SUMMARY, ensure_ascii=False)}]
+                }
+            }
+        }
+        data = (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8')
+        self.send(request, 200, 'application/json', data)
+
+    def file(self, request, method):
+        total = len(self.video)
+        start, end, status = 0, total - 1, 200
+        header = request.headers.get('Range')
+        if header and header.startswith('bytes='):
+            first, _, last = header[len('bytes='):].partition('-')
+            start = int(first) if first else max(0, total - int(last))
+            end = min(int(last), total - 1) if first and last else total - 1
+            status = 206
+
+        request.send_response(status)
+        request.send_header('Content-Type', 'video/mp4')
+        request.send_header('Accept-Ranges', 'bytes')
+        request.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            request.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        request.end_headers()
+        if method != 'HEAD':
+            request.wfile.write(self.video[start:end + 1])
+
+    def json(self, request, data, status=200):
+        self.send(request, status, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def send(self, request, status, content_type, data):
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
@@ -0,0 +1,115 @@
+# Таблицы YDB для прогона — те же, что в terraform/main.tf, но в отдельной папке на каждый запуск.
+
+TABLES = {
+    'TABLE_NAME': ('tasks', """
+        CREATE TABLE `{path}` (
+            id Uuid NOT NULL,
+            created_at Timestamp NOT NULL,
+            name Utf8,
+            url Utf8,
+            status Utf8 NOT NULL,
+            pdf Utf8,
+            error Utf8,
+            updated_at Timestamp,
+            PRIMARY KEY (id),
+            INDEX idx_created_at GLOBAL SYNC ON (created_at) COVER (name, url, status, pdf, error),
+            INDEX idx_status_created_at GLOBAL SYNC ON (status, created_at) COVER (name, url, pdf, error),
+            INDEX idx_updated_at GLOBAL SYNC ON (updated_at) COVER (name, url, created_at, status, pdf, error)
+        );
+    """),
+    'TASK_EVENTS_TABLE': ('task-events', """
+        CREATE TABLE `{path}` (
+            id Uuid NOT NULL,
+            ts Timestamp NOT NULL,
+            status Utf8 NOT NULL,
+            stage Utf8,
+            error Utf8,
+            pdf Utf8,
+            PRIMARY KEY (id, ts, status)
+        );
+    """),
+    'TASK_SPANS_TABLE': ('task-spans', """
+        CREATE TABLE `{path}` (
+            task_id Uuid NOT NULL,
+            started_at Timestamp NOT NULL,
+            stage Utf8 NOT NULL,
+            name Utf8 NOT NULL,
+            duration Double NOT NULL,
+            bytes Uint64,
+            PRIMARY KEY (task_id, started_at, stage, name),
+            INDEX idx_started_at GLOBAL ASYNC ON (started_at) COVER (duration, bytes)
+        );
+    """),
+    'LECTURES_TABLE': ('lectures', """
+        CREATE TABLE `{path}` (
+            key Utf8 NOT NULL,
+            task_id Uuid NOT NULL,
+            public_key Utf8,
+            status Utf8 NOT NULL,
+            pdf Utf8,
+            updated_at Timestamp,
+            PRIMARY KEY (key),
+            INDEX idx_task_id GLOBAL SYNC ON (task_id) COVER (status)
+        );
+    """),
+    'LECTURE_WAITERS_TABLE': ('lecture-waiters', """
+        CREATE TABLE `{path}` (
+            key Utf8 NOT NULL,
+            task_id Uuid NOT NULL,
+            created_at Timestamp,
+            PRIMARY KEY (key, task_id)
+        );
+    """),
+    'RECOGNITION_STATS_TABLE': ('recognition-stats', """
+        CREATE TABLE `{path}` (
+            finished_at Timestamp NOT NULL,
+            operation_id Utf8 NOT NULL,
+            audio_seconds Double NOT NULL,
+            elapsed_seconds Double NOT NULL,
+            PRIMARY KEY (finished_at, operation_id)
+        );
+    """),
+    'STAGE_CHECKPOINTS_TABLE': ('stage-checkpoints', """
+        CREATE TABLE `{path}` (
+            task_id Uuid NOT NULL,
+            stage Utf8 NOT NULL,
+            state Json,
+            updated_at Timestamp NOT NULL,
+            PRIMARY KEY (task_id, stage)
+        ) WITH (TTL = Interval("P7D") ON updated_at);
+    """),
+    'RATE_LIMITS_TABLE': ('rate-limits', """
+        CREATE TABLE `{path}` (
+            name Utf8 NOT NULL,
+            tokens Double NOT NULL,
+            refilled_at Timestamp NOT NULL,
+            PRIMARY KEY (name)
+        );
+    """),
+    'RATE_LEASES_TABLE': ('rate-leases', """
+        CREATE TABLE `{path}` (
+            name Utf8 NOT NULL,
+            holder Utf8 NOT NULL,
+            tenant Utf8 NOT NULL,
+            weight Uint32 NOT NULL,
+            acquired_at Timestamp,
+            expires_at Timestamp NOT NULL,
+            PRIMARY KEY (name, holder)
+        );
+    """),
+}
+
+
+def create_tables(runtime, prefix):
+    env = {}
+    for variable, (name, ddl) in TABLES.items():
+        path = f"{prefix}/{name}"
+        runtime.execute(ddl.format(path=path))
+        env[variable] = path
+    return env
+
+
+def drop_tables(runtime, env):
+    for variable in TABLES:
+        if variable in env:
+            runtime.execute(f"DROP TABLE `{env[variable]}`;")
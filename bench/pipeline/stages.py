@@ -0,0 +1,42 @@
+# Этап конвейера в бенчмарке: цикл триггера и список этапов — общие с локальным воркером
+# (src/common/stages.py), здесь только замер времени каждого вызова.
+# Каждый этап — отдельный процесс со своим окружением, как контейнер функции.
+import json
+import time
+
+from _support import load_function
+from common import stages
+
+STAGES = stages.STAGES
+
+
+def describe(body, received_at):
+    try:
+        message = json.loads(body)
+    except ValueError:
+        message = {}
+    if not isinstance(message, dict):
+        message = {}
+    # у первого этапа ещё нет отметки отправки — ждали с момента создания задания
+    sent_at = message.get('sent_at') or message.get('created_at')
+    return {
+        'id': message.get('id'),
+        'created_at': message.get('created_at'),
+        'wait': received_at - sent_at if sent_at else None,
+    }
+
+
+def serve(function, queue_url, env, batch_size, results, stop):
+    module = load_function(function, env)
+
+    def on_batch(received, received_at, elapsed, failed):
+        results.put({
+            'stage': function,
+            'started_at': received_at,
+            'finished_at': time.time(),
+            'elapsed': elapsed,
+            'failed': failed,
+            'messages': [describe(message['Body'], received_at) for message in received],
+        })
+
+    stages.serve(module, module.runtime.sqs(), queue_url, batch_size, stop, on_batch=on_batch)
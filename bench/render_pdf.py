@@ -0,0 +1,80 @@
+# Время рендеринга и пиковое потребление памяти generate_pdf на синтетических конспектах.
+# Каждый размер рендерится в отдельном процессе, чтобы ru_maxrss относился только к нему.
+# Запуск: pip install -r src/generate_pdf/requirements.txt && python bench/render_pdf.py
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from _support import SRC
+
+# примерно столько пунктов конспекта помещается на страницу A4
+ITEMS_PER_PAGE = 24
+
+
+class CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def make_summary(pages):
+    sections = {}
+    items = pages * ITEMS_PER_PAGE
+    for section in range(max(1, items // 20)):
+        sections[f"Раздел {section + 1}"] = {
+            "Определения": {
+                f"Термин {i + 1}": "Короткое определение термина, встречающегося в лекции & <примере>."
+                for i in range(5)
+            },
+            "Ключевые идеи": [
+                f"Идея {i + 1}: подробное пояснение ключевой мысли лекции (пример в скобках)."
+                for i in range(10)
+            ],
+            "Примеры": "Развёрнутый пример из лекции, иллюстрирующий раздел. " * 3,
+        }
+    return sections
+
+
+def run(pages, queue):
+    sys.path.insert(0, os.path.join(SRC, 'generate_pdf'))
+    import render
+
+    summary = make_summary(pages)
+    started = time.perf_counter()
+    render.get_styles()
+    setup = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sink = CountingSink()
+    rendered_pages = render.build(sink, render.summary_story("Синтетическая лекция", summary))
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss в Linux — в килобайтах
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((pages, rendered_pages, setup, elapsed, sink.size, peak_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', default='10,100,1000')
+    args = parser.parse_args()
+
+    print(f"{'target':>7} {'pages':>6} {'fonts, s':>9} {'render, s':>10} {'pdf, MB':>8} {'peak RSS, MB':>13}")
+    context = multiprocessing.get_context('spawn')
+    for pages in map(int, args.pages.split(',')):
+        queue = context.Queue()
+        process = context.Process(target=run, args=(pages, queue))
+        process.start()
+        target, rendered, setup, elapsed, size, peak_rss = queue.get()
+        process.join()
+        print(f"{target:>7} {rendered:>6} {setup:>9.2f} {elapsed:>10.2f} {size / 1024 / 1024:>8.1f} {peak_rss:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Время сборки ответа /ydb в зависимости от числа готовых конспектов на странице.
+# Запуск: pip install -r src/tasks/requirements.txt && python bench/tasks_listing.py
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from _support import load_function
+
+tasks = load_function('tasks')
+
+
+def make_rows(count):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        task_id = uuid.uuid4()
+        rows.append({
+            'id': task_id,
+            'name': f'Лекция {i}',
+            'url': 'https://disk.yandex.ru/i/bench',
+            'created_at': now - timedelta(seconds=i),
+            'status': 'успешно',
+            'pdf': f'{task_id}.pdf',
+            'error': None,
+        })
+    return rows
+
+
+def per_row_client(rows):
+    # поведение до кэша: новый клиент boto3 на каждую строку
+    import boto3
+
+    for row in rows:
+        s3 = boto3.client(
+            service_name='s3',
+            endpoint_url='https://storage.yandexcloud.net',
+            aws_access_key_id='bench',
+            aws_secret_access_key='bench',
+        )
+        s3.generate_presigned_url(
+            ClientMethod='get_object',
+            Params={'Bucket': 'bench-bucket', 'Key': row['pdf']},
+            ExpiresIn=600
+        )
+
+
+def cold_cache(rows):
+    tasks._presigned_urls.clear()
+    tasks.serialize_tasks(rows)
+
+
+def warm_cache(rows):
+    tasks.serialize_tasks(rows)
+
+
+def measure(fn, rows, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-baseline', action='store_true')
+    args = parser.parse_args()
+
+    # первый клиент создаётся один раз на контейнер, в замеры не входит
+    tasks.runtime.s3()
+
+    print(f"{'rows':>6} {'per-row client, ms':>20} {'cold cache, ms':>16} {'warm cache, ms':>16}")
+    for size in map(int, args.sizes.split(',')):
+        rows = make_rows(size)
+        baseline = '-' if args.skip_baseline else f'{measure(per_row_client, rows, args.repeat):.1f}'
+        cold = measure(cold_cache, rows, args.repeat)
+        tasks.serialize_tasks(rows)
+        warm = measure(warm_cache, rows, args.repeat)
+        print(f'{size:>6} {baseline:>20} {cold:>16.1f} {warm:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+from common import runtime
+
+# Результаты распознавания и конспекты хранятся сжатыми вне tmp/, чтобы конспект и PDF
+# можно было пересобрать без повторного похода в SpeechKit:
+#   artifacts/{id}/transcript/{index}.jsonl.gz — сырой поток getRecognition по частям лекции
+#   artifacts/{id}/parts/{index}.json.gz       — конспекты частей
+#   artifacts/{id}/segments.json.gz            — подписи частей (интервалы времени)
+#   artifacts/{id}/summary.json.gz             — итоговый конспект, из него рендерится PDF
+ROOT = 'artifacts'
+COMPRESS_LEVEL = 6
+
+
+def transcript_key(id, index):
+    return f"{ROOT}/{id}/transcript/{index:03d}.jsonl.gz"
+
+
+def part_key(id, index):
+    return f"{ROOT}/{id}/parts/{index:03d}.json.gz"
+
+
+def segments_key(id):
+    return f"{ROOT}/{id}/segments.json.gz"
+
+
+def summary_key(id):
+    return f"{ROOT}/{id}/summary.json.gz"
+
+
+def put(key, data, content_type):
+    runtime.s3().put_object(
+        Bucket=os.environ['BUCKET_NAME'],
+        Key=key,
+        Body=gzip.compress(data, compresslevel=COMPRESS_LEVEL),
+        ContentType=content_type,
+        ContentEncoding='gzip',
+    )
+
+
+def get(key):
+    resp = runtime.s3().get_object(Bucket=os.environ['BUCKET_NAME'], Key=key)
+    return gzip.decompress(resp["Body"].read())
+
+
+def exists(key):
+    try:
+        runtime.s3().head_object(Bucket=os.environ['BUCKET_NAME'], Key=key)
+        return True
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def put_json(key, data):
+    put(key, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+
+def get_json(key):
+    return json.loads(get(key))
+
+
+def put_lines(key, lines):
+    put(key, b'\n'.join(lines) + b'\n', 'application/x-ndjson')
+
+
+def get_lines(key):
+    return [line for line in get(key).splitlines() if line.strip()]
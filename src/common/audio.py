@@ -0,0 +1,94 @@
+import os
+
+# Профили кодирования аудио для распознавания. Имя профиля едет в сообщении (audio_format),
+# поэтому recognize_audio передаёт SpeechKit формат, в котором файл действительно записан,
+# а сообщения без поля — отправленные до профилей — остаются MP3.
+PROFILES = {
+    # прежний формат: полная частота и каналы исходника
+    'mp3': {
+        'codec': ['-c:a', 'libmp3lame', '-q:a', '6'],
+        'format': 'mp3',
+        'input': [],
+        'content_type': 'audio/mpeg',
+        'recognition': {'containerAudio': {'containerAudioType': 'MP3'}},
+    },
+    # речь в моно 16 кГц: файл в несколько раз меньше MP3 при той же точности распознавания
+    'opus16k': {
+        'codec': ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'],
+        'format': 'ogg',
+        'input': [],
+        'content_type': 'audio/ogg',
+        'recognition': {'containerAudio': {'containerAudioType': 'OGG_OPUS'}},
+    },
+    # без сжатия: больше всех, зато SpeechKit не тратит время на декодирование
+    'lpcm16k': {
+        'codec': ['-ac', '1', '-ar', '16000', '-c:a', 'pcm_s16le'],
+        'format': 's16le',
+        # у сырого PCM нет заголовка, при нарезке параметры потока задаются явно
+        'input': ['-f', 's16le', '-ar', '16000', '-ac', '1'],
+        'content_type': 'audio/L16',
+        'recognition': {
+            'rawAudio': {'audioEncoding': 'LINEAR16_PCM', 'sampleRateHertz': 16000, 'audioChannelCount': 1},
+        },
+    },
+}
+
+DEFAULT_PROFILE = 'mp3'
+
+# паузы длиннее 2 секунд сокращаются до полсекунды, тишина в начале убирается целиком
+SILENCE_FILTER = (
+    'silenceremove=start_periods=1:start_threshold=-45dB'
+    ':stop_periods=-1:stop_duration=2:stop_threshold=-45dB:stop_silence=0.5'
+)
+# однопроходная нормализация громкости под речь: тихий лектор и громкий зал — к одному уровню
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+
+
+def env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def settings():
+    profile = os.environ.get('AUDIO_PROFILE', DEFAULT_PROFILE)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown AUDIO_PROFILE: {profile}")
+    return profile, env_flag('AUDIO_TRIM_SILENCE'), env_flag('AUDIO_LOUDNORM')
+
+
+def filters(trim_silence=False, loudnorm=False):
+    chain = []
+    if trim_silence:
+        chain.append(SILENCE_FILTER)
+    if loudnorm:
+        chain.append(LOUDNORM_FILTER)
+    return chain
+
+
+def encode_args(profile, trim_silence=False, loudnorm=False):
+    # аргументы ffmpeg после -i: без видео, фильтры, кодек и формат контейнера
+    args = ['-vn']
+    chain = filters(trim_silence, loudnorm)
+    if chain:
+        args += ['-af', ','.join(chain)]
+    codec = PROFILES[profile]['codec']
+    if loudnorm and '-ar' not in codec:
+        # loudnorm отдаёт 192 кГц, профилю без своей частоты возвращаем обычную
+        codec = codec + ['-ar', '44100']
+    return args + codec + ['-f', PROFILES[profile]['format']]
+
+
+def cut_args(profile, url, start, length):
+    # нарезка готового аудио без перекодирования
+    return (
+        ['-ss', f'{start:.3f}', '-t', f'{length:.3f}']
+        + PROFILES[profile]['input']
+        + ['-i', url, '-c', 'copy', '-f', PROFILES[profile]['format']]
+    )
+
+
+def content_type(profile):
+    return PROFILES[profile]['content_type']
+
+
+def recognition_format(profile=None):
+    return PROFILES.get(profile or DEFAULT_PROFILE, PROFILES[DEFAULT_PROFILE])['recognition']
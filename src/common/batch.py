@@ -0,0 +1,97 @@
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from common import runtime, status, tracing
+
+# совпадает с maxReceiveCount в redrive_policy очередей
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+MAX_DELAY = 15 * 60
+
+
+def _workers(count):
+    return max(1, min(int(os.environ.get('BATCH_WORKERS', '10')), count))
+
+
+def _run(process, raw, stage=None):
+    body = raw['details']['message']['body']
+    received_at = time.time()
+    started = time.perf_counter()
+    message = None
+    try:
+        message = json.loads(body)
+        process(message)
+        return None
+    except Exception:
+        traceback.print_exc()
+        return body
+    finally:
+        if stage and isinstance(message, dict) and message.get('id'):
+            # ожидание считается от отправки предыдущим этапом, у первого этапа — от создания задания
+            tracing.queue_wait(message['id'], stage, message.get('sent_at') or message.get('created_at'), received_at)
+            tracing.record(message['id'], stage, 'handler', received_at, time.perf_counter() - started)
+
+
+def send_message(queue, message, delay=0):
+    params = {
+        'QueueUrl': queue,
+        'MessageBody': message if isinstance(message, str) else json.dumps(message),
+    }
+    if delay:
+        params['DelaySeconds'] = int(min(delay, MAX_DELAY))
+    runtime.sqs().send_message(**params)
+
+
+def retry_or_dead_letter(body):
+    # триггер удаляет из очереди весь батч целиком, поэтому неудачные сообщения
+    # переотправляем сами: обратно в текущую очередь или, когда попытки кончились, в DLQ
+    cur_queue = os.environ.get('CUR_QUEUE')
+    dlq = os.environ.get('DLQ')
+
+    try:
+        message = json.loads(body)
+    except ValueError:
+        message = None
+
+    if isinstance(message, dict):
+        attempt = int(message.get('attempt', 1))
+        if cur_queue and attempt < MAX_ATTEMPTS:
+            message['attempt'] = attempt + 1
+            send_message(cur_queue, message, RETRY_DELAY * attempt)
+            return
+
+    if dlq:
+        send_message(dlq, body)
+    else:
+        print(f"Message dropped after {MAX_ATTEMPTS} attempts: {body}")
+
+
+def process_batch(event, process, stage=None):
+    messages = event.get('messages', [])
+    if not messages:
+        return {"message": "ok", 'statusCode': 200, 'processed': 0, 'failed': 0}
+
+    with ThreadPoolExecutor(max_workers=_workers(len(messages))) as executor:
+        failed = [body for body in executor.map(lambda raw: _run(process, raw, stage), messages) if body is not None]
+
+    # неудачные сообщения переотправляются первыми: сбой записи ниже не должен
+    # вернуть в очередь весь батч вместе с успешными и сбросить счётчики попыток
+    for body in failed:
+        retry_or_dead_letter(body)
+
+    # статусы и замеры всех сообщений батча — по одному запросу в YDB
+    try:
+        status.flush()
+    except Exception:
+        # переходы остаются в памяти и записываются со следующим батчем этого контейнера
+        traceback.print_exc()
+    tracing.flush()
+
+    return {
+        "message": "ok",
+        'statusCode': 200,
+        'processed': len(messages) - len(failed),
+        'failed': len(failed),
+    }
@@ -0,0 +1,90 @@
+import json
+import os
+import uuid
+from common import runtime
+
+# Контрольные точки этапов: после таймаута видимости очередь доставляет сообщение повторно,
+# и этап по записи в stage_checkpoints продолжает с того места, где остановился, — готовые объекты
+# в Object Storage (совпадают размер и ETag), запущенные операции SpeechKit, отметка о завершении.
+# Без STAGE_CHECKPOINTS_TABLE в окружении точки не пишутся и этап просто выполняется заново.
+
+
+def _table():
+    return os.environ.get('STAGE_CHECKPOINTS_TABLE')
+
+
+def enabled():
+    return bool(_table())
+
+
+def load(task_id, stage):
+    table = _table()
+    if not table:
+        return {}
+
+    import ydb
+
+    query = f"""
+        SELECT state
+        FROM `{table}`
+        WHERE task_id = $task_id AND stage = $stage;
+    """
+    params = {
+        '$task_id': (uuid.UUID(str(task_id)), ydb.PrimitiveType.UUID),
+        '$stage': (stage, ydb.PrimitiveType.Utf8),
+    }
+    result = runtime.execute(query, params)
+    if result and result[0].rows and result[0].rows[0]['state']:
+        return json.loads(result[0].rows[0]['state'])
+    return {}
+
+
+def save(task_id, stage, state):
+    table = _table()
+    if not table:
+        return
+
+    import ydb
+
+    query = f"""
+        UPSERT INTO `{table}` (task_id, stage, state, updated_at)
+        VALUES ($task_id, $stage, $state, CurrentUtcTimestamp());
+    """
+    params = {
+        '$task_id': (uuid.UUID(str(task_id)), ydb.PrimitiveType.UUID),
+        '$stage': (stage, ydb.PrimitiveType.Utf8),
+        '$state': (json.dumps(state, ensure_ascii=False), ydb.PrimitiveType.Json),
+    }
+    runtime.execute(query, params)
+
+
+def complete(task_id, stage, state=None, **fields):
+    # отметка ставится после отправки в следующую очередь: повтор до неё переотправит, после — пропустит
+    state = dict(state or {})
+    state.update(fields, done=True)
+    save(task_id, stage, state)
+    return state
+
+
+def is_done(state):
+    return bool(state.get('done'))
+
+
+def head(bucket, key):
+    try:
+        resp = runtime.s3().head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return {'size': resp['ContentLength'], 'etag': resp['ETag'].strip('"')}
+
+
+def matches(bucket, key, expected):
+    # объект считается готовым, только если он того же размера и с тем же ETag, что записан в точке
+    if not expected:
+        return False
+    actual = head(bucket, key)
+    if actual is None or actual['size'] != expected.get('size'):
+        return False
+    return not expected.get('etag') or actual['etag'] == expected['etag']
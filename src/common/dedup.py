@@ -0,0 +1,162 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from common import runtime, status
+
+# Одну и ту же публичную лекцию присылают много раз. Индекс lectures хранит по ключу
+# содержимого файла задание-владельца, которое реально скачивает и распознаёт видео;
+# остальные задания ждут его в lecture_waiters и получают тот же PDF.
+# Статусы заданий меняются тем же запросом, что в common/status.py: с записью в журнал
+# и без отката более старшего статуса, но в одной транзакции с lectures и lecture_waiters.
+
+# владелец, от которого так долго нет вестей, считается потерянным
+STALE_AFTER = timedelta(hours=6)
+
+OWNER = 'owner'
+DONE = 'done'
+WAITING = 'waiting'
+
+
+def _tables():
+    return (
+        os.environ['TABLE_NAME'],
+        os.environ['LECTURES_TABLE'],
+        os.environ['LECTURE_WAITERS_TABLE'],
+    )
+
+
+def resource_key(public_key, resource):
+    size = resource.get('size', 0)
+    if resource.get('sha256'):
+        return f"sha256:{resource['sha256']}:{size}"
+    if resource.get('md5'):
+        return f"md5:{resource['md5']}:{size}"
+    return f"public_key:{public_key}:{resource.get('path', '/')}"
+
+# переход самого заявившего задания; параметры — из _event_params
+_TASK_EVENT = "$events = (SELECT $id AS id, $now AS ts, $status AS status, $stage AS stage, $error AS error, $pdf AS pdf);"
+
+
+def _event_params(task_uuid, now, status_name, stage, pdf=None):
+    import ydb
+
+    return {
+        '$id': (task_uuid, ydb.PrimitiveType.UUID),
+        '$now': (now, ydb.PrimitiveType.Timestamp),
+        '$status': (status_name, ydb.PrimitiveType.Utf8),
+        '$stage': (stage, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        '$error': (None, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        '$pdf': (pdf, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+    }
+
+
+def claim(key, task_id, public_key, stage=None):
+    import ydb
+
+    _, lectures_table, waiters_table = _tables()
+    task_uuid = uuid.UUID(task_id)
+    now = datetime.now(timezone.utc)
+
+    def callee(tx):
+        rows = runtime.fetch(tx, f"""
+            SELECT task_id, status, pdf, updated_at
+            FROM `{lectures_table}`
+            WHERE key = $key;
+        """, {'$key': (key, ydb.PrimitiveType.Utf8)})
+        lecture = rows[0] if rows else None
+
+        if lecture is not None and lecture['task_id'] != task_uuid:
+            if lecture['status'] == 'успешно':
+                runtime.fetch(tx, f"""
+                    {status.rank_function()}
+                    {_TASK_EVENT}
+                    {status.apply_query('$events')}
+                """, _event_params(task_uuid, now, 'успешно', stage, pdf=lecture['pdf']), commit=True)
+                return DONE
+
+            updated_at = lecture['updated_at']
+            if updated_at is not None and updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            stale = updated_at is None or now - updated_at > STALE_AFTER
+            if lecture['status'] != 'ошибка' and not stale:
+                runtime.fetch(tx, f"""
+                    {status.rank_function()}
+                    UPSERT INTO `{waiters_table}` (key, task_id, created_at)
+                    VALUES ($key, $id, $now);
+                    {_TASK_EVENT}
+                    {status.apply_query('$events')}
+                """, {
+                    '$key': (key, ydb.PrimitiveType.Utf8),
+                    **_event_params(task_uuid, now, 'в обработке', stage),
+                }, commit=True)
+                return WAITING
+
+        runtime.fetch(tx, f"""
+            UPSERT INTO `{lectures_table}` (key, task_id, public_key, status, pdf, updated_at)
+            VALUES ($key, $id, $public_key, 'в обработке', NULL, $now);
+        """, {
+            '$key': (key, ydb.PrimitiveType.Utf8),
+            '$id': (task_uuid, ydb.PrimitiveType.UUID),
+            '$public_key': (public_key, ydb.PrimitiveType.Utf8),
+            '$now': (now, ydb.PrimitiveType.Timestamp),
+        }, commit=True)
+        return OWNER
+
+    return runtime.transaction(callee)
+
+
+def _finish(task_id, status_name, pdf=None, error=None, stage=None):
+    import ydb
+
+    _, lectures_table, waiters_table = _tables()
+
+    task_uuid = uuid.UUID(task_id)
+
+    def callee(tx):
+        # завершаем только лекцию, которой владеет задание, и всех, кто её ждал.
+        # Ключи читаются отдельно: дальше фильтр не зависит от status, который тот же запрос
+        # перезаписывает, а lectures обновляется последним, после чтения и удаления ожидающих
+        keys = [row['key'] for row in runtime.fetch(tx, f"""
+            SELECT key FROM `{lectures_table}` VIEW idx_task_id
+            WHERE task_id = $id AND status != 'успешно';
+        """, {'$id': (task_uuid, ydb.PrimitiveType.UUID)})]
+        if not keys:
+            return
+
+        runtime.fetch(tx, f"""
+            {status.rank_function()}
+            $waiters = (
+                SELECT key, task_id
+                FROM `{waiters_table}`
+                WHERE key IN $keys
+            );
+
+            $events = (
+                SELECT task_id AS id, CurrentUtcTimestamp() AS ts, $status AS status, $stage AS stage, $error AS error, $pdf AS pdf
+                FROM $waiters
+            );
+            {status.apply_query('$events')}
+
+            DELETE FROM `{waiters_table}` ON
+            SELECT key, task_id FROM $waiters;
+
+            UPDATE `{lectures_table}`
+            SET status = $status, pdf = $pdf, updated_at = CurrentUtcTimestamp()
+            WHERE key IN $keys;
+        """, {
+            '$keys': (keys, ydb.ListType(ydb.PrimitiveType.Utf8)),
+            '$status': (status_name, ydb.PrimitiveType.Utf8),
+            '$stage': (stage, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+            '$pdf': (pdf, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+            '$error': (error, ydb.OptionalType(ydb.PrimitiveType.Utf8)),
+        }, commit=True)
+
+    runtime.transaction(callee)
+
+
+def complete(task_id, pdf, stage=None):
+    _finish(task_id, 'успешно', pdf=pdf, stage=stage)
+
+
+def fail(task_id, error, stage=None):
+    _finish(task_id, 'ошибка', error=error, stage=stage)
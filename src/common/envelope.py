@@ -0,0 +1,66 @@
+import time
+
+# Сообщение между этапами несёт весь контекст задания, чтобы этапам не нужно было
+# читать его из YDB. Поля первой версии (id, video_url, object_name, duration,
+# operation_id) сохраняют прежний смысл и формат, поэтому старые сообщения
+# в очередях и новые совместимы в обе стороны.
+VERSION = 2
+
+
+def now():
+    return round(time.time(), 3)
+
+
+def new(task_id, name, url, **fields):
+    message = {
+        'v': VERSION,
+        'id': str(task_id),
+        'name': name,
+        'video_url': url,
+        'created_at': now(),
+        'source': {},
+        'attempts': {},
+        'timings': {},
+    }
+    message.update(fields)
+    return message
+
+
+def upgrade(message):
+    # сообщения версии 1 отправлены до появления конверта: в них только id и данные этапа
+    if message.get('v', 1) < VERSION:
+        message['v'] = VERSION
+    message.setdefault('source', {})
+    message.setdefault('attempts', {})
+    message.setdefault('timings', {})
+    return message
+
+
+def receive(message, stage):
+    message = upgrade(message)
+    message['attempts'][stage] = message['attempts'].get(stage, 0) + 1
+    message['timings'].setdefault(stage, {})['received_at'] = now()
+    return message
+
+
+def forward(message, stage, drop=(), **fields):
+    # копия для следующей очереди: отметка отправки и обновлённые данные этапа
+    timings = {key: dict(value) for key, value in message.get('timings', {}).items()}
+    timings.setdefault(stage, {})['sent_at'] = now()
+
+    skip = {'attempt', 'timings', *drop}
+    result = {key: value for key, value in message.items() if key not in skip}
+    result['timings'] = timings
+    result['sent_at'] = timings[stage]['sent_at']
+    result.update(fields)
+    return result
+
+
+def duration_seconds(message):
+    if message.get('duration_seconds') is not None:
+        return float(message['duration_seconds'])
+    duration = message.get('duration')
+    if not duration:
+        return None
+    h, m, s = duration.split(":")
+    return int(h) * 3600 + int(m) * 60 + float(s)
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+# Раскладка объектов задания в бакете по дню создания: tmp/<день>/<id>/ — промежуточные файлы
+# этапов, pdf/<день>/<id>.pdf — готовый конспект. Чистильщику (src/sweeper) хватает одного
+# списка с разделителем на день, чтобы найти задания, и одного префикса, чтобы удалить всё по заданию.
+# День берётся из created_at сообщения, поэтому повторная доставка пишет в те же ключи.
+TMP_ROOT = 'tmp/'
+PDF_ROOT = 'pdf/'
+# сообщения версии 1 без created_at
+UNDATED = 'undated'
+
+# раскладка до шардирования по дням: tmp/<вид>/<id>..., PDF в корне бакета
+LEGACY_TMP_PREFIXES = ('tmp/video/', 'tmp/audio/', 'tmp/summary/', 'tmp/raw_text/')
+
+
+def day(created_at=None):
+    if not created_at:
+        return UNDATED
+    return datetime.fromtimestamp(float(created_at), timezone.utc).strftime('%Y-%m-%d')
+
+
+def tmp_prefix(task_id, created_at=None):
+    return f"{TMP_ROOT}{day(created_at)}/{task_id}/"
+
+
+def video_key(task_id, created_at=None):
+    return tmp_prefix(task_id, created_at) + 'video.mp4'
+
+
+def audio_key(task_id, created_at=None):
+    return tmp_prefix(task_id, created_at) + 'audio'
+
+
+def pdf_key(task_id, created_at=None):
+    return f"{PDF_ROOT}{day(created_at)}/{task_id}.pdf"
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Очереди в файле SQLite для локального режима (src/worker): то же подмножество API клиента
+# Message Queue, которым пользуются этапы, — send_message(_batch) с DelaySeconds, receive_message
+# с таймаутом видимости, delete_message(_batch) и счётчики get_queue_attributes.
+# Файл общий для всех процессов воркера и переживает его перезапуск. Адрес очереди — local:<имя>.
+
+PREFIX = 'local:'
+DEFAULT_VISIBILITY_TIMEOUT = 3600
+POLL_INTERVAL = 0.2
+# как redrive_policy очередей в terraform: после стольких получений сообщение уходит в DLQ
+MAX_RECEIVES = 3
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS messages (
+        id TEXT PRIMARY KEY,
+        queue TEXT NOT NULL,
+        body TEXT NOT NULL,
+        sent_at REAL NOT NULL,
+        visible_at REAL NOT NULL,
+        receipt TEXT,
+        receives INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS messages_queue ON messages (queue, visible_at);
+"""
+
+
+def url(name):
+    return PREFIX + name
+
+
+class Client:
+    def __init__(self, path, dead_letter_queue=None, max_receives=MAX_RECEIVES):
+        self.path = path
+        self.dead_letter_queue = dead_letter_queue
+        self.max_receives = max_receives
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # соединение SQLite нельзя делить между потоками — у каждого потока своё
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _transaction(self, callee):
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = callee(db)
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0, **kwargs):
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        self._transaction(lambda db: db.execute(
+            'INSERT INTO messages (id, queue, body, sent_at, visible_at) VALUES (?, ?, ?, ?, ?)',
+            (message_id, QueueUrl, MessageBody, now, now + (DelaySeconds or 0))
+        ))
+        return {'MessageId': message_id}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        now = time.time()
+        rows = [
+            (str(uuid.uuid4()), QueueUrl, entry['MessageBody'], now, now + entry.get('DelaySeconds', 0))
+            for entry in Entries
+        ]
+        self._transaction(lambda db: db.executemany(
+            'INSERT INTO messages (id, queue, body, sent_at, visible_at) VALUES (?, ?, ?, ?, ?)', rows
+        ))
+        return {
+            'Successful': [{'Id': entry['Id'], 'MessageId': row[0]} for entry, row in zip(Entries, rows)],
+            'Failed': [],
+        }
+
+    def _receive(self, queue, count, visibility_timeout):
+        def callee(db):
+            now = time.time()
+            if self.dead_letter_queue and queue != self.dead_letter_queue:
+                # сообщения, которые столько раз получали и не удалили, переезжают в DLQ
+                db.execute(
+                    'UPDATE messages SET queue = ?, visible_at = ?, receipt = NULL, receives = 0'
+                    ' WHERE queue = ? AND visible_at <= ? AND receives >= ?',
+                    (self.dead_letter_queue, now, queue, now, self.max_receives)
+                )
+            rows = db.execute(
+                'SELECT id, body FROM messages WHERE queue = ? AND visible_at <= ? ORDER BY visible_at LIMIT ?',
+                (queue, now, count)
+            ).fetchall()
+            messages = []
+            for message_id, body in rows:
+                receipt = uuid.uuid4().hex
+                db.execute(
+                    'UPDATE messages SET receipt = ?, visible_at = ?, receives = receives + 1 WHERE id = ?',
+                    (receipt, now + visibility_timeout, message_id)
+                )
+                messages.append({'MessageId': message_id, 'ReceiptHandle': f'{message_id}:{receipt}', 'Body': body})
+            return messages
+
+        return self._transaction(callee)
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None, **kwargs):
+        visibility_timeout = DEFAULT_VISIBILITY_TIMEOUT if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        while True:
+            messages = self._receive(QueueUrl, MaxNumberOfMessages, visibility_timeout)
+            if messages or time.monotonic() >= deadline:
+                return {'Messages': messages} if messages else {}
+            time.sleep(POLL_INTERVAL)
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        message_id, receipt = ReceiptHandle.split(':', 1)
+        self._transaction(lambda db: db.execute(
+            'DELETE FROM messages WHERE id = ? AND receipt = ?', (message_id, receipt)
+        ))
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries, **kwargs):
+        handles = [entry['ReceiptHandle'].split(':', 1) for entry in Entries]
+        self._transaction(lambda db: db.executemany(
+            'DELETE FROM messages WHERE id = ? AND receipt = ?', handles
+        ))
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None, **kwargs):
+        now = time.time()
+        visible, in_flight, delayed = self._connect().execute(
+            'SELECT'
+            ' COALESCE(SUM(visible_at <= ?), 0),'
+            ' COALESCE(SUM(visible_at > ? AND receipt IS NOT NULL), 0),'
+            ' COALESCE(SUM(visible_at > ? AND receipt IS NULL), 0)'
+            ' FROM messages WHERE queue = ?',
+            (now, now, now, QueueUrl)
+        ).fetchone()
+        return {'Attributes': {
+            'ApproximateNumberOfMessages': str(visible),
+            'ApproximateNumberOfMessagesNotVisible': str(in_flight),
+            'ApproximateNumberOfMessagesDelayed': str(delayed),
+        }}
+
+    def release(self):
+        # после перезапуска воркера сообщения, взятые погибшими процессами, снова видны сразу,
+        # а не через час таймаута видимости
+        now = time.time()
+        self._transaction(lambda db: db.execute(
+            'UPDATE messages SET visible_at = ?, receipt = NULL WHERE receipt IS NOT NULL AND visible_at > ?',
+            (now, now)
+        ))
+
+
+def open_client(path=None):
+    return Client(
+        path or os.environ.get('LOCAL_QUEUE_PATH', 'queues.sqlite3'),
+        dead_letter_queue=os.environ.get('LOCAL_DLQ', url('dlq')),
+    )
@@ -0,0 +1,183 @@
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from common import runtime
+
+# Общий для всех экземпляров функций лимитер вызовов SpeechKit и YandexGPT, состояние — в YDB.
+# Ведро токенов ограничивает частоту запросов, аренды — число одновременно идущих распознаваний,
+# а доля аренд на одного отправителя (tenant) не даёт массовой загрузке занять всю квоту.
+# Не допущенная работа не падает, а откладывается: вызывающий код получает задержку до повтора.
+
+LIMITS = {
+    # запуски распознавания: частота, запас и число частей лекций в работе одновременно
+    'stt': {
+        'rate': float(os.environ.get('STT_RATE', '1')),
+        'burst': float(os.environ.get('STT_BURST', '10')),
+        'in_flight': int(os.environ.get('STT_MAX_IN_FLIGHT', '20')),
+    },
+    'llm': {
+        'rate': float(os.environ.get('LLM_RATE', '2')),
+        'burst': float(os.environ.get('LLM_BURST', '10')),
+        'in_flight': None,
+    },
+}
+
+DEFAULT_TENANT = 'default'
+# аренда освобождается по завершении распознавания, срок — страховка от потерянных заданий
+LEASE_TTL = timedelta(hours=3)
+DEFER_DELAY = 30
+MAX_DELAY = 15 * 60
+MAX_WAIT = 20
+
+
+class RateLimited(Exception):
+    def __init__(self, delay):
+        super().__init__(f"Rate limited, retry in {delay:.0f}s")
+        self.delay = delay
+
+
+def _tables():
+    return os.environ.get('RATE_LIMITS_TABLE'), os.environ.get('RATE_LEASES_TABLE')
+
+
+def _utc(value):
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _jitter(delay):
+    # разброс, чтобы отложенные сообщения не возвращались все одновременно
+    return min(MAX_DELAY, max(1.0, delay) * random.uniform(1.0, 1.5))
+
+
+def retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', DEFER_DELAY))
+    except ValueError:
+        return DEFER_DELAY
+
+
+def _lease_delay(leases, limit, tenant, weight):
+    used = sum(lease['weight'] for lease in leases)
+    if used and used + weight > limit['in_flight']:
+        return _jitter(DEFER_DELAY)
+
+    # справедливая доля: квота делится поровну между отправителями, у которых сейчас есть работа
+    tenants = {lease['tenant'] for lease in leases} | {tenant}
+    share = max(1, limit['in_flight'] // len(tenants))
+    tenant_used = sum(lease['weight'] for lease in leases if lease['tenant'] == tenant)
+    if tenant_used and tenant_used + weight > share:
+        return _jitter(DEFER_DELAY * (1 + tenant_used / share))
+    return 0
+
+
+def _admit(name, holder, tenant, weight):
+    import ydb
+
+    limits_table, leases_table = _tables()
+    limit = LIMITS[name]
+    leased = holder is not None and limit['in_flight'] is not None
+
+    def callee(tx):
+        now = datetime.now(timezone.utc)
+        rows = runtime.fetch(tx, f"""
+            SELECT tokens, refilled_at
+            FROM `{limits_table}`
+            WHERE name = $name;
+        """, {'$name': (name, ydb.PrimitiveType.Utf8)})
+        tokens = limit['burst']
+        if rows:
+            elapsed = (now - _utc(rows[0]['refilled_at'])).total_seconds()
+            tokens = min(limit['burst'], rows[0]['tokens'] + max(elapsed, 0.0) * limit['rate'])
+
+        if leased:
+            leases = runtime.fetch(tx, f"""
+                SELECT holder, tenant, weight, expires_at
+                FROM `{leases_table}`
+                WHERE name = $name;
+            """, {'$name': (name, ydb.PrimitiveType.Utf8)})
+            leases = [lease for lease in leases if _utc(lease['expires_at']) > now]
+            # повтор того же сообщения: аренда уже выдана
+            if any(lease['holder'] == holder for lease in leases):
+                return 0
+            delay = _lease_delay(leases, limit, tenant, weight)
+            if delay:
+                return delay
+
+        # работа больше запаса ведра ждёт полного ведра, а не вечно
+        needed = min(weight, limit['burst'])
+        if tokens < needed:
+            return _jitter((needed - tokens) / limit['rate'])
+
+        params = {
+            '$name': (name, ydb.PrimitiveType.Utf8),
+            '$tokens': (tokens - weight, ydb.PrimitiveType.Double),
+            '$now': (now, ydb.PrimitiveType.Timestamp),
+        }
+        query = f"""
+            UPSERT INTO `{limits_table}` (name, tokens, refilled_at)
+            VALUES ($name, $tokens, $now);
+        """
+        if leased:
+            query += f"""
+                DELETE FROM `{leases_table}`
+                WHERE name = $name AND expires_at <= $now;
+
+                UPSERT INTO `{leases_table}` (name, holder, tenant, weight, acquired_at, expires_at)
+                VALUES ($name, $holder, $tenant, $weight, $now, $expires_at);
+            """
+            params.update({
+                '$holder': (holder, ydb.PrimitiveType.Utf8),
+                '$tenant': (tenant, ydb.PrimitiveType.Utf8),
+                '$weight': (weight, ydb.PrimitiveType.Uint32),
+                '$expires_at': (now + LEASE_TTL, ydb.PrimitiveType.Timestamp),
+            })
+        runtime.fetch(tx, query, params, commit=True)
+        return 0
+
+    return runtime.transaction(callee)
+
+
+def acquire(name, holder, tenant=None, weight=1):
+    # 0 — можно начинать, иначе через сколько секунд повторить; без таблиц лимитер выключен
+    if not _tables()[0]:
+        return 0
+    return _admit(name, str(holder), (tenant or DEFAULT_TENANT)[:100], weight)
+
+
+def take(name, count=1):
+    if not _tables()[0]:
+        return 0
+    return _admit(name, None, None, count)
+
+
+def wait(name, max_wait=MAX_WAIT):
+    # короткое ожидание внутри функции; дольше — RateLimited, и сообщение откладывается в очереди
+    deadline = time.monotonic() + max_wait
+    while True:
+        delay = take(name)
+        if not delay:
+            return
+        if time.monotonic() + delay > deadline:
+            raise RateLimited(delay)
+        time.sleep(delay)
+
+
+def release(holder, name=None):
+    _, leases_table = _tables()
+    if not leases_table:
+        return
+
+    import ydb
+
+    # аренд немного (не больше лимита одновременных распознаваний), поиск по holder без индекса
+    query = f"""
+        DELETE FROM `{leases_table}`
+        WHERE holder = $holder {'AND name = $name' if name else ''};
+    """
+    params = {'$holder': (str(holder), ydb.PrimitiveType.Utf8)}
+    if name:
+        params['$name'] = (name, ydb.PrimitiveType.Utf8)
+    runtime.execute(query, params)
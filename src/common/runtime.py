@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+# Драйвер YDB, пул сессий и клиенты boto3 живут на уровне модуля,
+# поэтому тёплый контейнер функции переиспользует их между вызовами
+# вместо того, чтобы каждый раз заново проходить TLS и discovery.
+
+# переопределяются локальными заменами сервисов в bench/pipeline
+S3_ENDPOINT = os.environ.get('S3_ENDPOINT', 'https://storage.yandexcloud.net')
+SQS_ENDPOINT = os.environ.get('SQS_ENDPOINT', 'https://message-queue.api.cloud.yandex.net')
+REGION = 'ru-central1'
+
+# клиенты общие для всех потоков батча и параллельной загрузки частей
+MAX_POOL_CONNECTIONS = 32
+
+HEALTH_CHECK_INTERVAL = 60
+DRIVER_WAIT_TIMEOUT = 5
+
+_lock = threading.RLock()
+_driver = None
+_pool = None
+_checked_at = 0.0
+_clients = {}
+
+
+def _connect():
+    import ydb
+
+    driver_config = ydb.DriverConfig(
+        endpoint=os.environ['YDB_ENDPOINT'],
+        database=os.environ['YDB_DATABASE'],
+        credentials=ydb.credentials_from_env_variables()
+    )
+    driver = ydb.Driver(driver_config)
+    try:
+        driver.wait(fail_fast=True, timeout=DRIVER_WAIT_TIMEOUT)
+    except Exception:
+        driver.stop()
+        raise
+    return driver, ydb.QuerySessionPool(driver)
+
+
+def reset_ydb():
+    global _driver, _pool, _checked_at
+    with _lock:
+        pool, driver = _pool, _driver
+        _driver, _pool, _checked_at = None, None, 0.0
+
+    if pool is not None:
+        try:
+            pool.stop()
+        except Exception:
+            pass
+    if driver is not None:
+        try:
+            driver.stop(timeout=1)
+        except Exception:
+            pass
+
+
+def get_pool():
+    global _driver, _pool, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _pool is not None and now - _checked_at > HEALTH_CHECK_INTERVAL:
+            try:
+                _driver.wait(fail_fast=True, timeout=DRIVER_WAIT_TIMEOUT)
+                _checked_at = now
+            except Exception:
+                reset_ydb()
+
+        if _pool is None:
+            _driver, _pool = _connect()
+            _checked_at = now
+
+        return _pool
+
+
+def _is_connection_error(e):
+    import ydb
+
+    return isinstance(e, (
+        ydb.issues.ConnectionError,
+        ydb.issues.Unavailable,
+        ydb.issues.SessionPoolClosed,
+    ))
+
+
+def execute(query, params=None):
+    try:
+        return get_pool().execute_with_retries(query, params)
+    except Exception as e:
+        if not _is_connection_error(e):
+            raise
+        # соединение протухло пока контейнер простаивал — переподключаемся один раз
+        reset_ydb()
+        return get_pool().execute_with_retries(query, params)
+
+
+def transaction(callee):
+    # callee(tx) может быть вызван повторно, поэтому он не должен иметь побочных эффектов вне tx
+    try:
+        return get_pool().retry_tx_sync(callee)
+    except Exception as e:
+        if not _is_connection_error(e):
+            raise
+        reset_ydb()
+        return get_pool().retry_tx_sync(callee)
+
+
+def fetch(tx, query, params=None, commit=False):
+    with tx.execute(query, params, commit_tx=commit) as result_sets:
+        return [row for result_set in result_sets for row in result_set.rows]
+
+
+def _client(service_name, **kwargs):
+    with _lock:
+        client = _clients.get(service_name)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            client = boto3.session.Session().client(
+                service_name=service_name,
+                aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+                config=Config(max_pool_connections=MAX_POOL_CONNECTIONS),
+                **kwargs
+            )
+            _clients[service_name] = client
+        return client
+
+
+def s3():
+    return _client('s3', endpoint_url=S3_ENDPOINT, region_name=REGION)
+
+
+def sqs():
+    # QUEUE_BACKEND=local — очереди в файле SQLite вместо Message Queue (режим src/worker)
+    if os.environ.get('QUEUE_BACKEND') == 'local':
+        with _lock:
+            client = _clients.get('localqueue')
+            if client is None:
+                from common import localqueue
+
+                client = _clients['localqueue'] = localqueue.open_client()
+            return client
+    return _client('sqs', endpoint_url=SQS_ENDPOINT, region_name=REGION)
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,92 @@
+from common import runtime
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class MultipartWriter:
+    # файлоподобный объект: копит данные до размера части и сразу отправляет её в Object Storage,
+    # поэтому в памяти держится не больше одной части независимо от размера файла
+
+    def __init__(self, bucket, key, content_type, part_size=8 * 1024 * 1024):
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.size = 0
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+
+    def write(self, data):
+        # буфер держит только недобранную часть: целые части отправляются срезами самих data,
+        # поэтому большой кусок за один write (PDF от reportlab) не копируется в буфер целиком
+        view = memoryview(data)
+        self.size += len(view)
+        if self._buffer:
+            take = min(self.part_size - len(self._buffer), len(view))
+            self._buffer += view[:take]
+            view = view[take:]
+            if len(self._buffer) < self.part_size:
+                return len(data)
+            self._upload_part(bytes(self._buffer))
+            self._buffer = bytearray()
+        while len(view) >= self.part_size:
+            self._upload_part(bytes(view[:self.part_size]))
+            view = view[self.part_size:]
+        self._buffer += view
+        return len(data)
+
+    def _upload_part(self, data):
+        s3 = runtime.s3()
+        if self._upload_id is None:
+            self._upload_id = s3.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType=self.content_type,
+            )['UploadId']
+
+        number = len(self._parts) + 1
+        resp = s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        self._parts.append({'PartNumber': number, 'ETag': resp['ETag']})
+
+    def close(self):
+        s3 = runtime.s3()
+        # маленький файл целиком поместился в буфер — multipart не нужен
+        if self._upload_id is None:
+            s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                ContentType=self.content_type,
+            )
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts},
+            )
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self._upload_id is not None:
+            runtime.s3().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,78 @@
+import importlib.util
+import os
+import sys
+import time
+import traceback
+
+# Этапы конвейера вне облака: локальный воркер (src/worker) и сквозной бенчмарк (bench/pipeline)
+# читают очереди этим циклом так же, как триггер Message Queue, и вызывают настоящие main.handler.
+
+# в каталоге функции common — симлинк, поэтому src/ ищется по настоящему пути модуля
+SRC = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# функция, её очередь и адреса очередей в окружении, как в terraform/main.tf
+STAGES = [
+    ('download_lecture', 'download', {'CUR_QUEUE': 'download', 'QUEUE': 'extract', 'RECOGNIZE_QUEUE': 'recognize', 'DLQ': 'dlq'}),
+    ('extract_audio', 'extract', {'CUR_QUEUE': 'extract', 'QUEUE': 'recognize', 'DLQ': 'dlq'}),
+    ('recognize_audio', 'recognize', {'CUR_QUEUE': 'recognize', 'NEXT_QUEUE': 'generate', 'DLQ': 'dlq'}),
+    ('generate_pdf', 'generate', {'CUR_QUEUE': 'generate', 'DLQ': 'dlq'}),
+    ('error', 'dlq', {'CUR_QUEUE': 'dlq'}),
+]
+
+POLL_SECONDS = 1
+BACKPRESSURE_WAIT = 2
+
+
+def load_function(name, env=None):
+    # окружение — как у контейнера функции: main читает его при импорте.
+    # У всех функций модуль называется main, поэтому он грузится под уникальным именем
+    os.environ.update(env or {})
+    function_dir = os.path.join(SRC, name)
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+    spec = importlib.util.spec_from_file_location(f'{name}_main', os.path.join(function_dir, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def trigger_event(received):
+    return {'messages': [
+        {'details': {'message': {'message_id': message['MessageId'], 'body': message['Body']}}}
+        for message in received
+    ]}
+
+
+def serve(module, sqs, queue_url, batch_size, stop, paused=None, on_batch=None):
+    # paused() — следующий этап не успевает, новых сообщений пока не брать;
+    # on_batch(received, received_at, elapsed, failed) вызывается после каждого батча
+    while not stop.is_set():
+        if paused is not None and paused():
+            stop.wait(BACKPRESSURE_WAIT)
+            continue
+
+        received = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=batch_size,
+            WaitTimeSeconds=POLL_SECONDS,
+        ).get('Messages', [])
+        if not received:
+            continue
+
+        received_at = time.time()
+        started = time.perf_counter()
+        try:
+            response = module.handler(trigger_event(received), None)
+            failed = response.get('failed', 0) if isinstance(response, dict) else 0
+            # как триггер: после успешного вызова батч удаляется из очереди целиком
+            sqs.delete_message_batch(QueueUrl=queue_url, Entries=[
+                {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']}
+                for index, message in enumerate(received)
+            ])
+        except Exception:
+            # батч не удаляется и вернётся после таймаута видимости
+            traceback.print_exc()
+            failed = len(received)
+
+        if on_batch is not None:
+            on_batch(received, received_at, time.perf_counter() - started, failed)
@@ -0,0 +1,117 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from common import runtime
+
+# Переходы статусов копятся в памяти и записываются одним запросом на весь батч:
+# все события — в журнал task_events, а в tasks — только более «старший» статус.
+# Поэтому поздняя запись из DLQ не может затереть уже выставленное «успешно».
+RANKS = {
+    'в очереди': 0,
+    'в обработке': 1,
+    'ошибка': 2,
+    'успешно': 3,
+}
+
+MAX_ERROR_LENGTH = 1000
+
+_lock = threading.Lock()
+_pending = []
+
+
+def record(task_id, status, error=None, pdf=None, stage=None):
+    event = {
+        'id': uuid.UUID(str(task_id)),
+        'ts': datetime.now(timezone.utc),
+        'status': status,
+        'rank': RANKS[status],
+        'error': error[:MAX_ERROR_LENGTH] if error is not None else None,
+        'pdf': pdf,
+        'stage': stage,
+    }
+    with _lock:
+        _pending.append(event)
+
+
+def coalesce(events):
+    # для каждого задания достаточно применить самый старший переход;
+    # при равенстве остаётся первый, как и первая ошибка в tasks
+    latest = {}
+    for event in events:
+        current = latest.get(event['id'])
+        if current is None or event['rank'] > current['rank']:
+            latest[event['id']] = event
+    return list(latest.values())
+
+
+def rank_function():
+    # аргумент назван не $status, чтобы не пересекаться с параметрами запросов common/dedup.py
+    rank_cases = " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in RANKS.items())
+    return f"$rank = ($name) -> {{ RETURN CASE $name {rank_cases} ELSE 0 END; }};"
+
+
+def apply_query(events, updates=None):
+    # events и updates — источники YQL со столбцами id, ts, status, stage, error, pdf;
+    # в запросе должна быть объявлена $rank из rank_function()
+    tasks_table = os.environ['TABLE_NAME']
+    events_table = os.environ['TASK_EVENTS_TABLE']
+    return f"""
+        UPSERT INTO `{events_table}`
+        SELECT id, ts, status, stage, error, pdf
+        FROM {events};
+
+        UPSERT INTO `{tasks_table}`
+        SELECT
+            u.id AS id,
+            u.status AS status,
+            u.error AS error,
+            COALESCE(u.pdf, t.pdf) AS pdf,
+            CurrentUtcTimestamp() AS updated_at
+        FROM {updates or events} AS u
+        JOIN `{tasks_table}` AS t ON t.id = u.id
+        WHERE $rank(t.status) < $rank(u.status);
+    """
+
+
+def flush():
+    global _pending
+    with _lock:
+        events, _pending = _pending, []
+    if not events:
+        return
+
+    import ydb
+
+    event_type = ydb.ListType(
+        ydb.StructType()
+        .add_member('id', ydb.PrimitiveType.UUID)
+        .add_member('ts', ydb.PrimitiveType.Timestamp)
+        .add_member('status', ydb.PrimitiveType.Utf8)
+        .add_member('rank', ydb.PrimitiveType.Uint8)
+        .add_member('error', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+        .add_member('pdf', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+        .add_member('stage', ydb.OptionalType(ydb.PrimitiveType.Utf8))
+    )
+
+    query = f"""
+        {rank_function()}
+        {apply_query('AS_TABLE($events)', 'AS_TABLE($updates)')}
+    """
+    params = {
+        '$events': (events, event_type),
+        '$updates': (coalesce(events), event_type),
+    }
+
+    try:
+        runtime.execute(query, params)
+    except Exception:
+        # не теряем переходы: батч будет переотправлен, а события применятся повторно
+        with _lock:
+            _pending[:0] = events
+        raise
+
+
+def set_status(task_id, status, error=None, pdf=None, stage=None):
+    record(task_id, status, error=error, pdf=pdf, stage=stage)
+    flush()
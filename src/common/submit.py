@@ -0,0 +1,91 @@
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from common import runtime, envelope
+
+# Создание заданий пачкой: одна вставка в YDB на все строки и SendMessageBatch по 10 сообщений.
+QUEUED = 'в очереди'
+SQS_BATCH_SIZE = 10
+SEND_WORKERS = 4
+
+
+def new_task(name, url, task_id=None, **fields):
+    return {
+        'id': task_id or uuid.uuid4(),
+        'created_at': datetime.now(timezone.utc),
+        'name': name,
+        'url': url,
+        'fields': fields,
+    }
+
+
+def insert(tasks, stage='create'):
+    if not tasks:
+        return
+
+    import ydb
+
+    task_type = ydb.ListType(
+        ydb.StructType()
+        .add_member('id', ydb.PrimitiveType.UUID)
+        .add_member('created_at', ydb.PrimitiveType.Timestamp)
+        .add_member('name', ydb.PrimitiveType.Utf8)
+        .add_member('url', ydb.PrimitiveType.Utf8)
+    )
+    query = f"""
+        -- уже существующие задания (повтор того же сообщения) не сбрасываются обратно в очередь
+        UPSERT INTO `{os.environ['TABLE_NAME']}`
+        SELECT n.id AS id, n.created_at AS created_at, n.name AS name, n.url AS url,
+            $status AS status, CurrentUtcTimestamp() AS updated_at
+        FROM AS_TABLE($tasks) AS n
+        LEFT ONLY JOIN `{os.environ['TABLE_NAME']}` AS t ON t.id = n.id;
+
+        UPSERT INTO `{os.environ['TASK_EVENTS_TABLE']}`
+        SELECT id, created_at AS ts, $status AS status, $stage AS stage
+        FROM AS_TABLE($tasks);
+    """
+    params = {
+        '$tasks': ([
+            {'id': task['id'], 'created_at': task['created_at'], 'name': task['name'], 'url': task['url']}
+            for task in tasks
+        ], task_type),
+        '$status': (QUEUED, ydb.PrimitiveType.Utf8),
+        '$stage': (stage, ydb.PrimitiveType.Utf8),
+    }
+    runtime.execute(query, params)
+
+
+def _send_group(queue, group):
+    response = runtime.sqs().send_message_batch(
+        QueueUrl=queue,
+        Entries=[
+            {
+                'Id': str(index),
+                'MessageBody': json.dumps(envelope.new(task['id'], task['name'], task['url'], **task['fields'])),
+            }
+            for index, task in enumerate(group)
+        ]
+    )
+    return {
+        str(group[int(failed['Id'])]['id']): failed.get('Message') or failed.get('Code', 'error')
+        for failed in response.get('Failed', [])
+    }
+
+
+def _try_send(queue, group):
+    try:
+        return _send_group(queue, group)
+    except Exception as e:
+        return {str(task['id']): str(e) for task in group}
+
+
+def enqueue(queue, tasks):
+    # id задания -> причина, по которой сообщение не ушло в очередь
+    groups = [tasks[i:i + SQS_BATCH_SIZE] for i in range(0, len(tasks), SQS_BATCH_SIZE)]
+    failed = {}
+    with ThreadPoolExecutor(max_workers=SEND_WORKERS) as executor:
+        for result in executor.map(lambda group: _try_send(queue, group), groups):
+            failed.update(result)
+    return failed
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from common import runtime
+
+# Замеры этапов (ожидание в очереди, обработчик, внешние API, объём данных) копятся в памяти
+# и пишутся в task_spans одним запросом в конце батча, как и статусы. Запись — по возможности:
+# потерянный замер не должен ломать обработку лекции.
+
+_lock = threading.Lock()
+_pending = []
+
+
+def record(task_id, stage, name, started_at, duration, size=None):
+    try:
+        task_id = uuid.UUID(str(task_id))
+    except ValueError:
+        return
+    span = {
+        'task_id': task_id,
+        'started_at': datetime.fromtimestamp(started_at, timezone.utc),
+        'stage': stage,
+        'name': name,
+        'duration': float(max(duration, 0.0)),
+        'bytes': int(size) if size is not None else None,
+    }
+    with _lock:
+        _pending.append(span)
+
+
+@contextmanager
+def span(task_id, stage, name):
+    # в data['bytes'] вызывающий код кладёт объём переданных данных
+    data = {'bytes': None}
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield data
+    finally:
+        record(task_id, stage, name, started_at, time.perf_counter() - started, data['bytes'])
+
+
+def queue_wait(task_id, stage, sent_at, received_at):
+    if sent_at:
+        record(task_id, stage, 'queue_wait', sent_at, received_at - sent_at)
+
+
+def flush():
+    global _pending
+    with _lock:
+        spans, _pending = _pending, []
+    # функции без таблицы замеров в окружении просто их не сохраняют
+    table = os.environ.get('TASK_SPANS_TABLE')
+    if not spans or not table:
+        return
+
+    import ydb
+
+    span_type = ydb.ListType(
+        ydb.StructType()
+        .add_member('task_id', ydb.PrimitiveType.UUID)
+        .add_member('started_at', ydb.PrimitiveType.Timestamp)
+        .add_member('stage', ydb.PrimitiveType.Utf8)
+        .add_member('name', ydb.PrimitiveType.Utf8)
+        .add_member('duration', ydb.PrimitiveType.Double)
+        .add_member('bytes', ydb.OptionalType(ydb.PrimitiveType.Uint64))
+    )
+    query = f"""
+        UPSERT INTO `{table}`
+        SELECT * FROM AS_TABLE($spans);
+    """
+    try:
+        runtime.execute(query, {'$spans': (spans, span_type)})
+    except Exception:
+        traceback.print_exc()
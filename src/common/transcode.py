@@ -0,0 +1,196 @@
+import math
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from common import runtime, checkpoint, tracing, audio, layout
+from common.s3stream import MultipartWriter
+
+# Кодирование аудио ffmpeg с записью прямо в Object Storage: общий код extract_audio
+# и совмещённого режима download_lecture, который читает видео с Диска без копии в бакете.
+
+# common лежит в каталоге функции (в архиве симлинк разворачивается в копию)
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+INPUT_URL_TTL = 3600
+PROBE_TIMEOUT = 60
+
+# длинные лекции режутся на части примерно такой длины и распознаются параллельно
+SEGMENT_SECONDS = int(os.environ.get('SEGMENT_SECONDS', '1200'))
+SEGMENT_WORKERS = 4
+
+# чтение по HTTP: обрыв соединения посреди многочасового видео не должен ронять кодирование
+RECONNECT_ARGS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '10']
+
+
+def find_binary(name):
+    # статические сборки ffmpeg/ffprobe кладутся рядом с main.py
+    path = os.path.join(FUNCTION_DIR, name)
+    return path if os.path.exists(path) else name
+
+
+FFMPEG = find_binary('ffmpeg')
+FFPROBE = find_binary('ffprobe')
+
+
+def input_url(bucket, object_name):
+    # ffmpeg читает видео по ссылке сам и при необходимости делает Range-запросы,
+    # так что mp4 с moov-атомом в конце тоже обрабатывается без временного файла
+    return runtime.s3().generate_presigned_url(
+        ClientMethod='get_object',
+        Params={'Bucket': bucket, 'Key': object_name},
+        ExpiresIn=INPUT_URL_TTL
+    )
+
+
+def input_args(url):
+    if url.startswith(('http://', 'https://')):
+        return RECONNECT_ARGS + ['-i', url]
+    return ['-i', url]
+
+
+def probe_duration(url):
+    result = subprocess.run(
+        [FFPROBE, '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', url],
+        capture_output=True, text=True, timeout=PROBE_TIMEOUT
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def format_duration(seconds):
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:05.2f}"
+
+
+def read_progress(stream, state):
+    # -progress пишет key=value; out_time_us — сколько секунд аудио уже закодировано
+    for raw in stream:
+        line = raw.decode('utf-8', 'replace').strip()
+        key, sep, value = line.partition('=')
+        if sep and key in ('out_time_us', 'out_time_ms') and value.isdigit():
+            state['out_time'] = int(value) / 1_000_000
+        elif not sep and line:
+            state['errors'].append(line)
+
+
+def run_ffmpeg(args, bucket, object_name, content_type):
+    command = [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-progress', 'pipe:2'] + args + ['pipe:1']
+    state = {'out_time': None, 'errors': deque(maxlen=20)}
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    progress = threading.Thread(target=read_progress, args=(process.stderr, state), daemon=True)
+    progress.start()
+
+    writer = MultipartWriter(bucket, object_name, content_type, PART_SIZE)
+    try:
+        for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+            writer.write(chunk)
+        process.wait()
+        progress.join()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {' '.join(state['errors'])}")
+        writer.close()
+    except Exception:
+        process.kill()
+        writer.abort()
+        raise
+
+    return state['out_time'], writer.size
+
+
+def extract_audio(url, bucket, object_name, profile, trim_silence=False, loudnorm=False):
+    return run_ffmpeg(
+        input_args(url) + audio.encode_args(profile, trim_silence, loudnorm),
+        bucket,
+        object_name,
+        audio.content_type(profile)
+    )
+
+
+def segment_bounds(duration):
+    if not duration or duration <= SEGMENT_SECONDS * 1.5:
+        return []
+    count = math.ceil(duration / SEGMENT_SECONDS)
+    length = duration / count
+    return [(index, index * length, length) for index in range(count)]
+
+
+def cut_segment(url, bucket, object_name, profile, start, length):
+    # -c copy не перекодирует аудио, поэтому нарезка почти ничего не стоит
+    return run_ffmpeg(audio.cut_args(profile, url, start, length), bucket, object_name, audio.content_type(profile))
+
+
+def split_audio(id, stage, bucket, object_name, duration, profile, state):
+    bounds = segment_bounds(duration)
+    if not bounds:
+        return []
+
+    url = input_url(bucket, object_name)
+    # части, нарезанные до повторной доставки, повторно не режутся
+    cut_parts = state.setdefault('segments', {})
+
+    def cut(bound):
+        index, start, length = bound
+        segment_object_name = f"{object_name}/{index:03d}"
+        if not checkpoint.matches(bucket, segment_object_name, cut_parts.get(str(index))):
+            with tracing.span(id, stage, 'ffmpeg.segment') as span:
+                _, span['bytes'] = cut_segment(url, bucket, segment_object_name, profile, start, length)
+            if checkpoint.enabled():
+                cut_parts[str(index)] = checkpoint.head(bucket, segment_object_name)
+        return {"object_name": segment_object_name, "start": round(start, 3), "duration": round(length, 3)}
+
+    try:
+        with ThreadPoolExecutor(max_workers=SEGMENT_WORKERS) as executor:
+            return list(executor.map(cut, bounds))
+    finally:
+        checkpoint.save(id, stage, state)
+
+
+def encode(id, stage, source, bucket, state, created_at=None):
+    # source — функция, возвращающая ссылку на видео: она нужна, только если аудио ещё не закодировано.
+    # Возвращает поля сообщения для recognize_audio
+    profile, trim_silence, loudnorm = audio.settings()
+    audio_object_name = layout.audio_key(id, created_at)
+
+    encoded_audio = state.get('audio') or {}
+    if encoded_audio.get('profile') == profile and checkpoint.matches(bucket, audio_object_name, encoded_audio):
+        # аудио уже закодировано прошлой доставкой — ни ffprobe, ни ffmpeg не нужны
+        duration, encoded = encoded_audio['duration'], encoded_audio['encoded']
+    else:
+        url = source()
+
+        with tracing.span(id, stage, 'ffprobe'):
+            duration = probe_duration(url)
+
+        with tracing.span(id, stage, 'ffmpeg') as span:
+            encoded, span['bytes'] = extract_audio(url, bucket, audio_object_name, profile, trim_silence, loudnorm)
+        if duration is None:
+            duration = encoded
+
+        if checkpoint.enabled():
+            state['audio'] = {
+                **checkpoint.head(bucket, audio_object_name),
+                'profile': profile,
+                'duration': duration,
+                'encoded': encoded,
+            }
+            checkpoint.save(id, stage, state)
+
+    # без пауз аудио короче видео: части режутся по длительности того, что закодировано
+    audio_duration = encoded if trim_silence and encoded else duration
+    segments = split_audio(id, stage, bucket, audio_object_name, audio_duration, profile, state)
+
+    return {
+        'object_name': audio_object_name,
+        'duration': format_duration(duration or 0),
+        'duration_seconds': round(duration or 0, 3),
+        'segments': segments,
+        'audio_format': profile,
+    }
@@ -1,68 +1,205 @@
+import base64
+import csv
+import io
 import json
-import ydb
 import os
 import uuid
-from datetime import datetime, timezone
-import boto3
 from urllib.parse import parse_qs
+from common import runtime, envelope, submit, status, artifacts, ratelimit
 
-YDB_ENDPOINT = os.environ['YDB_ENDPOINT']
-YDB_DATABASE = os.environ['YDB_DATABASE']
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
 QUEUE = os.environ['QUEUE']
+RECOGNIZE_QUEUE = os.environ['RECOGNIZE_QUEUE']
+GENERATE_QUEUE = os.environ['GENERATE_QUEUE']
 TABLE_NAME = os.environ['TABLE_NAME']
 
+MAX_BULK_ITEMS = 500
+MAX_NAME_LENGTH = 500
+
+def get_tenant(event):
+    # отправитель для справедливого деления квоты SpeechKit: явный заголовок или адрес клиента
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    identity = (event.get("requestContext") or {}).get("identity") or {}
+    return headers.get("x-tenant-id") or identity.get("sourceIp") or ratelimit.DEFAULT_TENANT
+
 def create(name, video_url):
-    driver_config = ydb.DriverConfig(
-        endpoint=YDB_ENDPOINT,
-        database=YDB_DATABASE,
-        credentials=ydb.credentials_from_env_variables()
+    task = submit.new_task(name, video_url)
+    submit.insert([task])
+    return task['id']
+
+def send_message_to_queue(id, name, video_url, tenant=None):
+    runtime.sqs().send_message(
+        QueueUrl=QUEUE,
+        MessageBody=json.dumps(envelope.new(id, name, video_url, tenant=tenant))
     )
-    with ydb.Driver(driver_config) as driver:
-        driver.wait(fail_fast=True, timeout=5)
-
-        query = f""" 
-            UPSERT INTO `{TABLE_NAME}` (id, created_at, name, url, status, pdf, error)
-            VALUES ($id, $created_at, $name, $url, $status, NULL, NULL);
-        """
-
-        task_id = uuid.uuid4()
-        created_at = datetime.now(timezone.utc)
-        params = {
-            '$id': (task_id, ydb.PrimitiveType.UUID),
-            '$created_at': (created_at, ydb.PrimitiveType.Timestamp), 
-            '$name': (name, ydb.PrimitiveType.Utf8),
-            '$url': (video_url, ydb.PrimitiveType.Utf8),
-            '$status': ('в очереди', ydb.PrimitiveType.Utf8)
+
+def read_body(event):
+    body = event.get("body", "") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    return body
+
+def json_response(status_code, data):
+    return {
+        "statusCode": status_code,
+        "body": json.dumps(data, ensure_ascii=False),
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*"
         }
+    }
 
-        with ydb.QuerySessionPool(driver) as pool:
-            pool.execute_with_retries(query, params)
+def parse_lectures(body, content_type):
+    text = body.lstrip('\ufeff').strip()
+    if 'json' in content_type or text[:1] in ('[', '{'):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('lectures')
+        if not isinstance(data, list):
+            raise ValueError("Expected a list of lectures")
+        return [item if isinstance(item, dict) else {} for item in data]
 
-    return task_id
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    # заголовок необязателен: без него первая колонка — название, вторая — ссылка
+    header = [cell.strip().lower() for cell in rows[0]] if rows else []
+    if 'name' in header and 'url' in header:
+        return [dict(zip(header, row)) for row in rows[1:]]
+    return [{'name': row[0], 'url': row[1] if len(row) > 1 else ''} for row in rows]
 
-def send_message_to_queue(id, video_url):
-    s3_client = boto3.client(
-        service_name='sqs',
-        endpoint_url='https://message-queue.api.cloud.yandex.net',
-        region_name='ru-central1',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
+def validate(items, tenant=None):
+    results, valid, seen = [], [], {}
+    for index, item in enumerate(items):
+        name = str(item.get('name') or '').strip()
+        video_url = str(item.get('url') or '').strip()
+        result = {'index': index, 'name': name, 'url': video_url}
 
-    s3_client.send_message(
-        QueueUrl=QUEUE,
-        MessageBody=json.dumps({"id": str(id), "video_url": video_url})
+        if not name:
+            error = "Поле 'name' обязательно"
+        elif len(name) > MAX_NAME_LENGTH:
+            error = "Слишком длинное название"
+        elif not video_url:
+            error = "Поле 'url' обязательно"
+        elif video_url in seen:
+            error = f"Ссылка уже указана в строке {seen[video_url] + 1}"
+        else:
+            error = None
+
+        if error:
+            result.update(status='invalid', error=error)
+        else:
+            seen[video_url] = index
+            result['task'] = submit.new_task(name, video_url, tenant=tenant)
+            valid.append(result)
+        results.append(result)
+    return results, valid
+
+def create_bulk(items, tenant=None):
+    results, valid = validate(items, tenant)
+    tasks = [result['task'] for result in valid]
+
+    # все задания — одной вставкой, сообщения — пачками по 10
+    submit.insert(tasks)
+    failed = submit.enqueue(QUEUE, tasks)
+
+    for result in valid:
+        task = result.pop('task')
+        result['id'] = str(task['id'])
+        if result['id'] in failed:
+            print(f"Failed to enqueue {result['id']}: {failed[result['id']]}")
+            result.update(status='error', error="Не удалось поставить задание в очередь")
+            status.record(task['id'], 'ошибка', error=result['error'], stage='create')
+        else:
+            result['status'] = 'created'
+    status.flush()
+
+    return results
+
+def bulk_handler(event):
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    try:
+        items = parse_lectures(read_body(event), headers.get("content-type", ""))
+    except Exception:
+        return json_response(400, {"error": "Ожидается JSON-массив или CSV с колонками name, url"})
+
+    if not items:
+        return json_response(400, {"error": "Список лекций пуст"})
+    if len(items) > MAX_BULK_ITEMS:
+        return json_response(400, {"error": f"За один раз можно загрузить не больше {MAX_BULK_ITEMS} лекций"})
+
+    try:
+        results = create_bulk(items, get_tenant(event))
+    except Exception as e:
+        return json_response(500, {"error": "Ошибка при создании заданий", "message": str(e)})
+
+    return json_response(200, {
+        "created": sum(1 for result in results if result['status'] == 'created'),
+        "failed": sum(1 for result in results if result['status'] != 'created'),
+        "results": results,
+    })
+
+def get_task(task_id):
+    import ydb
+
+    query = f"""
+        SELECT name, url, pdf
+        FROM `{TABLE_NAME}`
+        WHERE id = $id;
+    """
+    result = runtime.execute(query, {'$id': (task_id, ydb.PrimitiveType.UUID)})
+    if result and result[0].rows:
+        return result[0].rows[0]
+    return None
+
+def regenerate(task_id, target, task, tenant=None):
+    # summary — заново конспект из сохранённого транскрипта и PDF, pdf — только PDF из сохранённого конспекта
+    if target == 'summary':
+        queue, fields = RECOGNIZE_QUEUE, {'regenerate': 'summary'}
+        ready = artifacts.exists(artifacts.segments_key(task_id))
+    else:
+        queue, fields = GENERATE_QUEUE, {'object_name': artifacts.summary_key(task_id), 'regenerate': 'pdf'}
+        ready = artifacts.exists(artifacts.summary_key(task_id))
+    if not ready:
+        return False
+    if task.get('pdf'):
+        # PDF пересобирается на месте, ссылки на него у заданий-дублей остаются рабочими
+        fields['pdf_key'] = task['pdf']
+
+    runtime.sqs().send_message(
+        QueueUrl=queue,
+        MessageBody=json.dumps(envelope.new(task_id, task['name'], task['url'], tenant=tenant, **fields))
     )
+    return True
 
-def handler(event, context):
+def regenerate_handler(event):
     try:
-        body = event.get("body", "")
+        data = json.loads(read_body(event) or "{}")
+        task_id = uuid.UUID(str(data.get('id')))
+    except Exception:
+        return json_response(400, {"error": "Ожидается JSON с полем 'id'"})
+
+    target = data.get('target', 'pdf')
+    if target not in ('summary', 'pdf'):
+        return json_response(400, {"error": "Поле 'target' может быть 'summary' или 'pdf'"})
+
+    try:
+        task = get_task(task_id)
+        if task is None:
+            return json_response(404, {"error": "Задание не найдено"})
+        if not regenerate(task_id, target, task, get_tenant(event)):
+            return json_response(409, {"error": "Для задания нет сохранённого транскрипта или конспекта"})
+    except Exception as e:
+        return json_response(500, {"error": "Ошибка при постановке задания в очередь", "message": str(e)})
 
-        if event.get("isBase64Encoded"):
-            import base64
-            body = base64.b64decode(body).decode("utf-8")
+    return json_response(202, {"id": str(task_id), "target": target})
+
+def handler(event, context):
+    path = (event.get("path") or "").rstrip("/")
+    if path.endswith("/bulk"):
+        return bulk_handler(event)
+    if path.endswith("/regenerate"):
+        return regenerate_handler(event)
+
+    try:
+        body = read_body(event)
 
         data = parse_qs(body)
         data = {k: v[0] for k, v in data.items()}
@@ -101,7 +238,7 @@ def handler(event, context):
 
     try:
         task_id = create(name, video_url)
-        send_message_to_queue(task_id, video_url)
+        send_message_to_queue(task_id, name, video_url, get_tenant(event))
     except Exception as e:
         return {
             "statusCode": 500,
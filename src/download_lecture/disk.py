@@ -0,0 +1,128 @@
+import asyncio
+import os
+import threading
+import aiohttp
+
+# Клиент публичных ресурсов Яндекс Диска. Сессия aiohttp живёт в отдельном потоке с постоянным
+# event loop, поэтому соединения переиспользуются между сообщениями батча и вызовами функции,
+# а синхронные обработчики просто ждут результат корутины.
+DISK_API_URL = os.environ.get('DISK_API_URL', 'https://cloud-api.yandex.net')
+RESOURCES_PATH = '/v1/disk/public/resources'
+DOWNLOAD_PATH = '/v1/disk/public/resources/download'
+
+REQUEST_TIMEOUT = 10
+MAX_CONNECTIONS = 16
+PAGE_SIZE = 100
+# ограничения раскрытия публичной папки в задания
+MAX_FOLDER_DEPTH = 3
+MAX_FOLDER_VIDEOS = 500
+
+FIELDS = 'type,name,mime_type,path,size,md5,sha256'
+RETRYABLE_STATUSES = (408, 429)
+
+_lock = threading.Lock()
+_loop = None
+_session = None
+
+
+def _get_loop():
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='disk-client', daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _run(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def _get_session():
+    # создаётся и используется только в потоке event loop
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=300),
+        )
+    return _session
+
+
+async def _get_json(path, params):
+    session = await _get_session()
+    async with session.get(DISK_API_URL + path, params=params) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+def _params(public_key, path=None, **extra):
+    params = {'public_key': public_key, **extra}
+    if path:
+        params['path'] = path
+    return params
+
+
+def is_rejected(error):
+    # ссылка неверна, удалена или закрыта — повтор не поможет; таймауты, 429 и 5xx
+    # пробрасываются, и сообщение обрабатывается повторно
+    return 400 <= error.status < 500 and error.status not in RETRYABLE_STATUSES
+
+
+def is_video(resource):
+    return bool(resource) and resource.get('type') == 'file' and (resource.get('mime_type') or '').startswith('video/')
+
+
+def is_folder(resource):
+    return bool(resource) and resource.get('type') == 'dir'
+
+
+async def _resolve(public_key, path):
+    try:
+        resource = await _get_json(RESOURCES_PATH, _params(public_key, path, fields=FIELDS))
+    except aiohttp.ClientResponseError as e:
+        if not is_rejected(e):
+            raise
+        return None, None
+    # ссылка на скачивание нужна только видео: для папок и прочих файлов запрос не делается
+    if not is_video(resource):
+        return resource, None
+    download = await _get_json(DOWNLOAD_PATH, _params(public_key, path))
+    return resource, download.get('href')
+
+
+def resolve(public_key, path=None):
+    return _run(_resolve(public_key, path))
+
+
+async def _list_page(public_key, path, offset):
+    data = await _get_json(RESOURCES_PATH, _params(public_key, path, limit=PAGE_SIZE, offset=offset))
+    return data.get('_embedded', {})
+
+
+async def _list_videos(public_key, path, depth):
+    first = await _list_page(public_key, path, 0)
+    items = list(first.get('items', []))
+
+    # остальные страницы папки — параллельно, как только известно их число
+    total = min(first.get('total', len(items)), MAX_FOLDER_VIDEOS * 2)
+    pages = await asyncio.gather(*[
+        _list_page(public_key, path, offset) for offset in range(PAGE_SIZE, total, PAGE_SIZE)
+    ])
+    for page in pages:
+        items.extend(page.get('items', []))
+
+    videos = [item for item in items if is_video(item)]
+    if depth < MAX_FOLDER_DEPTH:
+        nested = await asyncio.gather(*[
+            _list_videos(public_key, item['path'], depth + 1) for item in items if is_folder(item)
+        ])
+        for folder_videos in nested:
+            videos.extend(folder_videos)
+    return videos
+
+
+def list_videos(public_key, path=None):
+    videos = _run(_list_videos(public_key, path, 0))
+    return sorted(videos, key=lambda item: item.get('path', ''))[:MAX_FOLDER_VIDEOS]
@@ -1,112 +1,150 @@
-import requests
-import boto3
 import os
 import json
-import ydb
 import uuid
+from common import runtime, batch, checkpoint, dedup, envelope, layout, status, submit, tracing, audio
 
-YDB_ENDPOINT = os.environ['YDB_ENDPOINT']
-YDB_DATABASE = os.environ['YDB_DATABASE']
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
 BUCKET_NAME = os.environ['BUCKET_NAME']
 QUEUE = os.environ['QUEUE']
-TABLE_NAME = os.environ['TABLE_NAME']
-
-def valid_ya_disk_video_url(video_url: str) -> bool:
-    url = "https://cloud-api.yandex.net/v1/disk/public/resources"
-    params = {"public_key": video_url}
-    try:
-        resp = requests.get(url, params, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            return data.get('type') == 'file' and data.get('mime_type', '').startswith('video/')
-        else:
-            return False
-    except Exception:
-        return False
-    
-def download_video(task_id: str, video_url: str) -> str:
-    object_name = f"tmp/video/{task_id}.mp4"
-    
-    url = "https://cloud-api.yandex.net/v1/disk/public/resources/download"
-    params = {'public_key': video_url}
-    response = requests.get(url, params, timeout=10)
-    response.raise_for_status()
-
-    link = response.json()['href']
-
-    response = requests.get(link, stream=True, timeout=60)
-    response.raise_for_status()
-    
-    session = boto3.session.Session()
-    s3 = session.client(
-        service_name='s3',
-        endpoint_url="https://storage.yandexcloud.net",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    )
-    
-    s3.upload_fileobj(
-        response.raw,
-        BUCKET_NAME,
-        object_name,
-        ExtraArgs={'ContentType': response.headers.get('content-type', 'video/mp4')}
-    )
+CUR_QUEUE = os.environ['CUR_QUEUE']
+
+# совмещённый режим: ffmpeg читает видео прямо с Диска, в бакет попадает только аудио,
+# а сообщение идёт сразу в recognize_audio, минуя extract_audio
+FUSED_MODE = audio.env_flag('FUSED_MODE')
+RECOGNIZE_QUEUE = os.environ.get('RECOGNIZE_QUEUE')
+
+def download_video(task_id: str, href: str, state: dict, size=None, created_at=None) -> str:
+    # requests и пул соединений нужны только для скачивания, не для отклонённых ссылок и папок
+    import transfer
+
+    object_name = layout.video_key(task_id, created_at)
+
+    # видео уже целиком в бакете после прошлой доставки — хватает HEAD-запроса
+    if checkpoint.matches(BUCKET_NAME, object_name, state.get('video') or ({'size': size} if size else None)):
+        return object_name
+
+    def remember(upload_id):
+        # повторная доставка докачает только недостающие части этой multipart-загрузки
+        state['upload_id'] = upload_id
+        checkpoint.save(task_id, 'download_lecture', state)
+
+    with tracing.span(task_id, 'download_lecture', 'transfer') as span:
+        span['bytes'] = transfer.copy_to_s3(
+            href,
+            BUCKET_NAME,
+            object_name,
+            upload_id=state.get('upload_id'),
+            # без контрольных точек незавершённую загрузку некому продолжить, transfer её отменит
+            on_upload_id=remember if checkpoint.enabled() else None,
+        )
 
+    # размер и ETag готового видео попадут в точку вместе с отметкой о завершении этапа
+    state.pop('upload_id', None)
+    if checkpoint.enabled():
+        state['video'] = checkpoint.head(BUCKET_NAME, object_name)
     return object_name
 
+def video_title(item):
+    return os.path.splitext(item.get('name') or os.path.basename(item.get('path', '')))[0]
+
+def expand_folder(message):
+    # ссылка на папку превращается в отдельное задание на каждое видео в ней
+    import disk
+
+    id = message['id']
+    video_url = message['video_url']
+    with tracing.span(id, 'download_lecture', 'disk.folder'):
+        videos = disk.list_videos(video_url, message.get('path'))
+
+    if not videos:
+        insert_data(id, "В папке нет видео")
+        return
+
+    # id производные от папки и пути — повтор сообщения не создаст дубли
+    name = message.get('name') or 'Лекция'
+    tasks = [
+        submit.new_task(
+            f"{name} — {video_title(item)}",
+            video_url,
+            task_id=uuid.uuid5(uuid.UUID(id), item['path']),
+            path=item['path'],
+            parent_id=id,
+            tenant=message.get('tenant'),
+        )
+        for item in videos
+    ]
+    submit.insert(tasks, stage='download_lecture')
+    failed = submit.enqueue(CUR_QUEUE, tasks)
+    for task_id in failed:
+        status.record(task_id, 'ошибка', error="Не удалось поставить задание в очередь", stage='download_lecture')
+    status.record(id, 'успешно', stage='download_lecture')
+
 def insert_data(task_id, error=None):
-    driver_config = ydb.DriverConfig(
-        endpoint=YDB_ENDPOINT,
-        database=YDB_DATABASE,
-        credentials=ydb.credentials_from_env_variables()
-    )
-    with ydb.Driver(driver_config) as driver:
-        driver.wait(fail_fast=True, timeout=5)
-
-        query = f""" 
-            UPDATE `{TABLE_NAME}`
-            SET status = $status, error = $error
-            WHERE id = $id;
-        """
-        params = {
-            '$id': (uuid.UUID(task_id), ydb.PrimitiveType.UUID),
-            '$status': ('ошибка' if error is not None else 'в обработке', ydb.PrimitiveType.Utf8),
-            '$error': (error, ydb.OptionalType(ydb.PrimitiveType.Utf8))
-        }
-
-        with ydb.QuerySessionPool(driver) as pool:
-            pool.execute_with_retries(query, params)
-
-
-def send_message_to_queue(id, object_name):
-    s3_client = boto3.client(
-        service_name='sqs',
-        endpoint_url='https://message-queue.api.cloud.yandex.net',
-        region_name='ru-central1',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
+    if error is not None:
+        status.record(task_id, 'ошибка', error=error, stage='download_lecture')
+    else:
+        # «в обработке» видно сразу, а не после многоминутного скачивания в конце батча
+        status.set_status(task_id, 'в обработке', stage='download_lecture')
+
 
-    s3_client.send_message(
-        QueueUrl=QUEUE,
-        MessageBody=json.dumps({"id": str(id), "object_name": object_name})
+def extract_audio(task_id: str, href: str, state: dict, created_at=None) -> dict:
+    # ffmpeg импортируется только в совмещённом режиме, раздельному он не нужен
+    from common import transcode
+    return transcode.encode(task_id, 'download_lecture', lambda: href, BUCKET_NAME, state, created_at)
+
+def send_message_to_queue(message, queue=QUEUE):
+    runtime.sqs().send_message(
+        QueueUrl=queue,
+        MessageBody=json.dumps(message)
     )
 
-def handler(event, context):
-    message = json.loads(event['messages'][0]['details']['message']['body'])
+def process_message(message):
+    message = envelope.receive(message, 'download_lecture')
     id = message['id']
     video_url = message['video_url']
 
-    if valid_ya_disk_video_url(video_url):
-        insert_data(id)
-    else:
+    # повторная доставка уже переданного дальше сообщения
+    state = checkpoint.load(id, 'download_lecture')
+    if checkpoint.is_done(state):
+        return
+
+    # aiohttp и его event loop нужны только сообщениям, которые действительно идут к Диску
+    import disk
+
+    with tracing.span(id, 'download_lecture', 'disk.resolve'):
+        resource, href = disk.resolve(video_url, message.get('path'))
+
+    if disk.is_folder(resource):
+        expand_folder(message)
+        return
+    if not disk.is_video(resource):
         insert_data(id, "Невалидная ссылка для скачивания видео")
-        return {"message": "ok", 'statusCode': 200}
+        return
+
+    # повторная лекция ждёт или сразу получает результат задания-владельца
+    key = dedup.resource_key(video_url, resource)
+    if dedup.claim(key, id, video_url, stage='download_lecture') != dedup.OWNER:
+        return
 
-    object_name = download_video(id, video_url)
-    send_message_to_queue(id, object_name)
+    insert_data(id)
 
-    return {"message": "ok", 'statusCode': 200}
+    if href is None:
+        raise RuntimeError(f"Download link is not available for {video_url}")
+    source = {
+        'public_key': video_url,
+        'key': key,
+        'path': resource.get('path'),
+        'size': resource.get('size'),
+        'md5': resource.get('md5'),
+        'sha256': resource.get('sha256'),
+    }
+    if FUSED_MODE:
+        fields = extract_audio(id, href, state, message.get('created_at'))
+        send_message_to_queue(envelope.forward(message, 'download_lecture', source=source, **fields), RECOGNIZE_QUEUE)
+    else:
+        object_name = download_video(id, href, state, resource.get('size'), message.get('created_at'))
+        send_message_to_queue(envelope.forward(message, 'download_lecture', object_name=object_name, source=source))
+    checkpoint.complete(id, 'download_lecture', state)
+
+def handler(event, context):
+    return batch.process_batch(event, process_message, 'download_lecture')
     
\ No newline at end of file
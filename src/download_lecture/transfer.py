@@ -0,0 +1,157 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from common import runtime
+
+MB = 1024 * 1024
+
+PART_SIZE = int(os.environ.get('TRANSFER_PART_SIZE_MB', '8')) * MB
+CONCURRENCY = int(os.environ.get('TRANSFER_CONCURRENCY', '4'))
+PART_RETRIES = 3
+READ_TIMEOUT = 60
+
+# ограничения multipart upload в Object Storage
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+_local = threading.local()
+
+
+def _session():
+    # requests.Session не потокобезопасна, поэтому по одной сессии на поток
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=CONCURRENCY))
+        _local.session = session
+    return session
+
+
+def probe(href):
+    # Диск отдаёт редирект на downloader, поэтому дальше работаем с итоговым адресом
+    response = _session().get(href, headers={'Range': 'bytes=0-0'}, stream=True, timeout=READ_TIMEOUT)
+    try:
+        response.raise_for_status()
+        content_type = response.headers.get('content-type', 'video/mp4')
+        content_range = response.headers.get('content-range', '')
+        if response.status_code == 206 and '/' in content_range and not content_range.endswith('*'):
+            return response.url, int(content_range.rsplit('/', 1)[1]), content_type
+        return response.url, None, content_type
+    finally:
+        response.close()
+
+
+def part_ranges(total, part_size=PART_SIZE):
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(total / MAX_PARTS))
+    return [
+        (number, start, min(start + part_size, total) - 1)
+        for number, start in enumerate(range(0, total, part_size), start=1)
+    ]
+
+
+def _fetch(url, start, end):
+    response = _session().get(url, headers={'Range': f'bytes={start}-{end}'}, timeout=READ_TIMEOUT)
+    response.raise_for_status()
+    if response.status_code != 206 or len(response.content) != end - start + 1:
+        raise IOError(f"Unexpected range response for bytes {start}-{end}")
+    return response.content
+
+
+def _copy_part(url, bucket, key, upload_id, number, start, end):
+    error = None
+    for _ in range(PART_RETRIES):
+        try:
+            data = _fetch(url, start, end)
+            resp = runtime.s3().upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=data,
+            )
+            return {'PartNumber': number, 'ETag': resp['ETag']}
+        except Exception as e:
+            error = e
+    raise error
+
+
+def _uploaded_parts(bucket, key, upload_id):
+    parts = {}
+    paginator = runtime.s3().get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+        for part in page.get('Parts', []):
+            parts[part['PartNumber']] = part
+    return parts
+
+
+def _stream_upload(url, bucket, key, content_type):
+    from boto3.s3.transfer import TransferConfig
+
+    response = _session().get(url, stream=True, timeout=READ_TIMEOUT)
+    response.raise_for_status()
+    with response:
+        runtime.s3().upload_fileobj(
+            response.raw,
+            bucket,
+            key,
+            ExtraArgs={'ContentType': content_type},
+            Config=TransferConfig(multipart_chunksize=PART_SIZE, max_concurrency=CONCURRENCY),
+        )
+
+
+def copy_to_s3(href, bucket, key, upload_id=None, on_upload_id=None):
+    url, total, content_type = probe(href)
+
+    # сервер не поддерживает Range — остаётся один поток
+    if total is None or total <= MIN_PART_SIZE:
+        _stream_upload(url, bucket, key, content_type)
+        return total
+
+    s3 = runtime.s3()
+    done = {}
+    if upload_id:
+        try:
+            done = _uploaded_parts(bucket, key, upload_id)
+        except s3.exceptions.NoSuchUpload:
+            upload_id = None
+
+    if not upload_id:
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        if on_upload_id is not None:
+            on_upload_id(upload_id)
+
+    parts = []
+    pending = []
+    for number, start, end in part_ranges(total):
+        uploaded = done.get(number)
+        if uploaded is not None and uploaded['Size'] == end - start + 1:
+            parts.append({'PartNumber': number, 'ETag': uploaded['ETag']})
+        else:
+            pending.append((number, start, end))
+
+    # в памяти одновременно не больше CONCURRENCY частей
+    executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+    try:
+        futures = [
+            executor.submit(_copy_part, url, bucket, key, upload_id, number, start, end)
+            for number, start, end in pending
+        ]
+        parts.extend(future.result() for future in futures)
+    except Exception:
+        executor.shutdown(wait=True, cancel_futures=True)
+        # незавершённую загрузку оставляем, если вызывающий запомнил upload_id и сможет её продолжить
+        if on_upload_id is None:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    executor.shutdown()
+
+    s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])},
+    )
+    return total
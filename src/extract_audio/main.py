@@ -0,0 +1,36 @@
+import json
+import os
+from common import runtime, batch, checkpoint, envelope, transcode
+
+BUCKET_NAME = os.environ['BUCKET_NAME']
+QUEUE = os.environ['QUEUE']
+
+def send_message_to_queue(message):
+    runtime.sqs().send_message(
+        QueueUrl=QUEUE,
+        MessageBody=json.dumps(message)
+    )
+
+def process_message(message):
+    message = envelope.receive(message, 'extract_audio')
+    id = message['id']
+
+    # повторная доставка уже переданного дальше сообщения
+    state = checkpoint.load(id, 'extract_audio')
+    if checkpoint.is_done(state):
+        return
+
+    fields = transcode.encode(
+        id,
+        'extract_audio',
+        lambda: transcode.input_url(BUCKET_NAME, message['object_name']),
+        BUCKET_NAME,
+        state,
+        message.get('created_at'),
+    )
+
+    send_message_to_queue(envelope.forward(message, 'extract_audio', **fields))
+    checkpoint.complete(id, 'extract_audio', state)
+
+def handler(event, context):
+    return batch.process_batch(event, process_message, 'extract_audio')
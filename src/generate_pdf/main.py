@@ -1,140 +1,88 @@
-import boto3
+import gzip
 import os
-import ydb
 import json
-import io
 import uuid
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import cm, mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from common import runtime, batch, checkpoint, dedup, envelope, layout, status, tracing
+from common.s3stream import MultipartWriter
 
 BUCKET_NAME = os.environ['BUCKET_NAME']
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
-YDB_ENDPOINT = os.environ['YDB_ENDPOINT']
-YDB_DATABASE = os.environ['YDB_DATABASE']
 TABLE_NAME = os.environ['TABLE_NAME']
 
 def get_name(id):
-    driver_config = ydb.DriverConfig(
-        endpoint=YDB_ENDPOINT,
-        database=YDB_DATABASE,
-        credentials=ydb.credentials_from_env_variables()
-    )
+    import ydb
 
-    with ydb.Driver(driver_config) as driver:
-        driver.wait(fail_fast=True, timeout=5)
+    query = f"""
+        SELECT name
+        FROM `{TABLE_NAME}`
+        WHERE id = $id;
+    """
 
-        query = f"""
-            SELECT name
-            FROM `{TABLE_NAME}`
-            WHERE id = $id;
-        """
+    params = {
+        '$id': (uuid.UUID(id), ydb.PrimitiveType.UUID),
+    }
 
-        params = {
-            '$id': (uuid.UUID(id), ydb.PrimitiveType.UUID),
-        }
+    result = runtime.execute(query, params)
 
-        with ydb.QuerySessionPool(driver) as pool:
-            result = pool.execute_with_retries(query, params)
-
-        if result and result[0].rows:
-            return result[0].rows[0]['name']
+    if result and result[0].rows:
+        return result[0].rows[0]['name']
 
     raise Exception(f"Lecture name not found for id={id}")
 
-def save_pdf(object_name, id):
-    s3 = boto3.client(
-        service_name='s3',
-        endpoint_url="https://storage.yandexcloud.net",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    )
-
-    resp = s3.get_object(Bucket=BUCKET_NAME, Key=object_name)
-    text = resp["Body"].read().decode("utf-8")
-
-    name = get_name(id)
-
-    pdf_bytes_io = io.BytesIO()
-
-    pdfmetrics.registerFont(TTFont('DejaVuSans','DejaVuSans.ttf', 'UTF-8'))
-    styles = getSampleStyleSheet() 
-    styles['Normal'].fontName='DejaVuSans'
-    styles['Heading1'].fontName='DejaVuSans'
-
-    
-    doc = SimpleDocTemplate(pdf_bytes_io, pagesize=A4,
-                            rightMargin=2*cm, leftMargin=2*cm,
-                            topMargin=2*cm, bottomMargin=2*cm)
-    story = []
-    
-    story.append(Paragraph(name, styles['Heading1']))
-    story.append(Spacer(1, 6 * mm))
-
-    for line in text.splitlines():
-        if line.strip():
-            story.append(Paragraph(line, styles['Normal']))
-            story.append(Spacer(1, 2*mm)) 
-
-    doc.build(story)
-    pdf_bytes_io.seek(0)
-
-    pdf_object_name = f'{id}.pdf'
-    s3.put_object(
-        Bucket=BUCKET_NAME,
-        Key=pdf_object_name,
-        Body=pdf_bytes_io.read(),
-        ContentType='application/pdf'
-    )
-    return pdf_object_name
-
-def insert_data(task_id: str, status: str, pdf: str | None = None, error: str | None = None):
-    driver_config = ydb.DriverConfig(
-        endpoint=YDB_ENDPOINT,
-        database=YDB_DATABASE,
-        credentials=ydb.credentials_from_env_variables()
-    )
-    with ydb.Driver(driver_config) as driver:
-        driver.wait(fail_fast=True, timeout=5)
-
-        set_parts = ["status = $status"]
-        params = {
-            '$id': (uuid.UUID(task_id), ydb.PrimitiveType.UUID),
-            '$status': (status, ydb.PrimitiveType.Utf8),
-        }
-
-        if pdf is not None:
-            set_parts.append("pdf = $pdf")
-            params['$pdf'] = (pdf, ydb.PrimitiveType.Utf8)
-
-        if error is not None:
-            set_parts.append("error = $error")
-            params['$error'] = (error[:1000], ydb.PrimitiveType.Utf8)
-
-        query = f"""
-            UPDATE `{TABLE_NAME}`
-            SET {", ".join(set_parts)}
-            WHERE id = $id;
-        """
-
-        with ydb.QuerySessionPool(driver) as pool:
-            pool.execute_with_retries(query, params)
-
-def handler(event, context):
-    message = json.loads(event['messages'][0]['details']['message']['body'])
+def save_pdf(object_name, pdf_object_name, id, name=None):
+    # reportlab грузится при первом рендеринге, а не при холодном старте контейнера
+    import render
+
+    with tracing.span(id, 'generate_pdf', 's3.summary') as span:
+        resp = runtime.s3().get_object(Bucket=BUCKET_NAME, Key=object_name)
+        raw = resp["Body"].read()
+        span['bytes'] = len(raw)
+    # конспекты из artifacts/ хранятся сжатыми
+    if object_name.endswith('.gz'):
+        raw = gzip.decompress(raw)
+        object_name = object_name[:-len('.gz')]
+    content = raw.decode("utf-8")
+
+    # название приходит в сообщении; в YDB идём только за сообщениями старого формата
+    if name is None:
+        name = get_name(id)
+
+    if object_name.endswith('.json'):
+        story = render.summary_story(name, json.loads(content))
+    else:
+        story = render.text_story(name, content)
+
+    with tracing.span(id, 'generate_pdf', 'render') as span:
+        with MultipartWriter(BUCKET_NAME, pdf_object_name, 'application/pdf') as writer:
+            render.build(writer, story)
+        span['bytes'] = writer.size
+
+def insert_data(task_id: str, status_name: str, pdf: str | None = None, error: str | None = None):
+    status.record(task_id, status_name, error=error, pdf=pdf, stage='generate_pdf')
+
+def process_message(message):
+    message = envelope.receive(message, 'generate_pdf')
     task_id = message['id']
     object_name = message['object_name']
 
+    # повторная доставка уже отрендеренного PDF; пересборка по запросу выполняется всегда
+    if not message.get('regenerate') and checkpoint.is_done(checkpoint.load(task_id, 'generate_pdf')):
+        return
+
+    # пересборка перезаписывает уже выданный PDF: на тот же ключ ссылаются задания-дубли из dedup
+    pdf_object_name = message.get('pdf_key') or layout.pdf_key(task_id, message.get('created_at'))
     try:
-        pdf_object_name = save_pdf(object_name, task_id)
+        save_pdf(object_name, pdf_object_name, task_id, message.get('name'))
         insert_data(task_id, 'успешно', pdf=pdf_object_name)
     except Exception as e:
         # может эта проверка и не нужна, можно было оставить выброс исключения, 
         # тогда сообщение в очереди обрабатывалось бы
         # пока не перешло бы в dlq, где у меня есть обработчик, к-ый ставит статус "ошибка"
         # но я решила так оставить для этой функции
-        insert_data(task_id, 'ошибка', error='Произошла ошибка при создании PDF-конспекта')
\ No newline at end of file
+        insert_data(task_id, 'ошибка', error='Произошла ошибка при создании PDF-конспекта')
+        dedup.fail(task_id, 'Произошла ошибка при создании PDF-конспекта', stage='generate_pdf')
+    else:
+        dedup.complete(task_id, pdf_object_name, stage='generate_pdf')
+        checkpoint.complete(task_id, 'generate_pdf', pdf=pdf_object_name)
+
+def handler(event, context):
+    return batch.process_batch(event, process_message, 'generate_pdf')
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import threading
+from xml.sax.saxutils import escape
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm, mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, ListFlowable, ListItem
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DejaVuSans.ttf')
+
+# шрифт и стили создаются один раз на контейнер
+_lock = threading.Lock()
+_styles = None
+
+
+def get_styles():
+    global _styles
+    with _lock:
+        if _styles is None:
+            pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+            base = getSampleStyleSheet()
+            _styles = {
+                'title': ParagraphStyle('NoteTitle', parent=base['Heading1'], fontName=FONT_NAME, spaceAfter=6 * mm),
+                'headings': [
+                    ParagraphStyle('NoteHeading1', parent=base['Heading2'], fontName=FONT_NAME),
+                    ParagraphStyle('NoteHeading2', parent=base['Heading3'], fontName=FONT_NAME),
+                    ParagraphStyle('NoteHeading3', parent=base['Heading4'], fontName=FONT_NAME),
+                ],
+                'body': ParagraphStyle('NoteBody', parent=base['Normal'], fontName=FONT_NAME, spaceAfter=2 * mm),
+            }
+        return _styles
+
+
+def text(value):
+    return escape(str(value))
+
+
+def heading(styles, title, level):
+    levels = styles['headings']
+    return Paragraph(text(title), levels[min(level, len(levels) - 1)])
+
+
+def render_value(styles, value, level):
+    if isinstance(value, dict):
+        flowables = []
+        for key, item in value.items():
+            # короткий скаляр выводим строкой «ключ: значение», а не отдельным разделом
+            if not isinstance(item, (dict, list)) and level >= len(styles['headings']):
+                flowables.append(Paragraph(f"<b>{text(key)}:</b> {text(item)}", styles['body']))
+                continue
+            flowables.append(heading(styles, key, level))
+            flowables.extend(render_value(styles, item, level + 1))
+        return flowables
+
+    if isinstance(value, list):
+        items = [
+            ListItem(render_value(styles, item, level + 1) or [Paragraph('', styles['body'])])
+            for item in value
+        ]
+        return [ListFlowable(items, bulletType='bullet', bulletFontName=FONT_NAME, leftIndent=5 * mm)]
+
+    if value is None or value == '':
+        return []
+
+    return [Paragraph(text(value), styles['body'])]
+
+
+def summary_story(name, summary):
+    styles = get_styles()
+    return [Paragraph(text(name), styles['title'])] + render_value(styles, summary, 0)
+
+
+def text_story(name, raw_text):
+    # конспекты, сохранённые до перехода на JSON, — просто строки
+    styles = get_styles()
+    story = [Paragraph(text(name), styles['title'])]
+    for line in raw_text.splitlines():
+        if line.strip():
+            story.append(Paragraph(text(line), styles['body']))
+    return story
+
+
+def build(output, story):
+    doc = SimpleDocTemplate(output, pagesize=A4,
+                            rightMargin=2*cm, leftMargin=2*cm,
+                            topMargin=2*cm, bottomMargin=2*cm)
+    doc.build(story)
+    return doc.page
@@ -0,0 +1,122 @@
+import math
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from common import runtime
+
+STATS_TABLE = os.environ['RECOGNITION_STATS_TABLE']
+
+# модель elapsed = slope * audio_seconds + intercept по последним наблюдениям
+HISTORY_SIZE = 500
+MIN_OBSERVATIONS = 10
+MODEL_TTL = 600
+
+MIN_DELAY = 10
+MAX_DELAY = 15 * 60
+# после прогнозного момента опрашиваем часто, а затем всё реже, если SpeechKit задерживается
+LATE_DELAY = 15
+MAX_LATE_DELAY = 5 * 60
+
+# прежняя формула duration // 6 + 30 — пока нет своей истории
+PRIOR = (1 / 6, 30.0, 60.0)
+
+_lock = threading.Lock()
+_model = None
+_model_at = 0.0
+# наблюдения копятся за батч и пишутся одним запросом, как статусы и замеры этапов
+_pending = []
+
+
+def fit(points):
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        slope = 0.0
+    else:
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x)
+    intercept = mean_y - slope * mean_x
+    residuals = [y - (slope * x + intercept) for x, y in points]
+    spread = math.sqrt(sum(r * r for r in residuals) / n)
+    return slope, intercept, spread
+
+
+def load_model():
+    global _model, _model_at
+    with _lock:
+        if _model is not None and time.monotonic() - _model_at < MODEL_TTL:
+            return _model
+
+        query = f"""
+            SELECT audio_seconds, elapsed_seconds
+            FROM `{STATS_TABLE}`
+            ORDER BY finished_at DESC
+            LIMIT {HISTORY_SIZE};
+        """
+        try:
+            rows = runtime.execute(query)[0].rows
+            points = [(row['audio_seconds'], row['elapsed_seconds']) for row in rows]
+            _model = fit(points) if len(points) >= MIN_OBSERVATIONS else PRIOR
+        except Exception:
+            traceback.print_exc()
+            _model = _model or PRIOR
+        _model_at = time.monotonic()
+        return _model
+
+
+def record(operation_id, audio_seconds, elapsed_seconds):
+    observation = {
+        'operation_id': operation_id,
+        'audio_seconds': float(audio_seconds),
+        'elapsed_seconds': float(elapsed_seconds),
+        'finished_at': datetime.now(timezone.utc),
+    }
+    with _lock:
+        _pending.append(observation)
+
+
+def flush():
+    global _pending
+    with _lock:
+        observations, _pending = _pending, []
+    if not observations:
+        return
+
+    import ydb
+
+    observation_type = ydb.ListType(
+        ydb.StructType()
+        .add_member('operation_id', ydb.PrimitiveType.Utf8)
+        .add_member('audio_seconds', ydb.PrimitiveType.Double)
+        .add_member('elapsed_seconds', ydb.PrimitiveType.Double)
+        .add_member('finished_at', ydb.PrimitiveType.Timestamp)
+    )
+    query = f"""
+        UPSERT INTO `{STATS_TABLE}`
+        SELECT * FROM AS_TABLE($observations);
+    """
+    try:
+        runtime.execute(query, {'$observations': (observations, observation_type)})
+    except Exception:
+        # без этих наблюдений прогноз просто дольше опирается на старую историю
+        traceback.print_exc()
+
+
+def next_delay(operation, audio_seconds, now=None):
+    now = now or time.time()
+    slope, intercept, spread = load_model()
+    # целимся чуть раньше прогноза, чтобы не проспать типичное завершение
+    expected = operation.setdefault('started_at', now) + slope * audio_seconds + intercept - spread
+    remaining = expected - now
+
+    if remaining > MIN_DELAY:
+        delay = remaining
+    else:
+        late_polls = operation.get('late_polls', 0)
+        operation['late_polls'] = late_polls + 1
+        delay = min(LATE_DELAY * 2 ** late_polls, MAX_LATE_DELAY)
+
+    return int(min(max(delay, MIN_DELAY), MAX_DELAY))
@@ -1,29 +1,34 @@
 import json
 import os
-import requests
-import boto3
-import io
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from common import runtime, batch, checkpoint, envelope, tracing, artifacts, ratelimit, audio
+import summarize
+import eta
 
 BUCKET_NAME = os.environ['BUCKET_NAME']
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
 CUR_QUEUE = os.environ['CUR_QUEUE']
 FOLDER_ID = os.environ['FOLDER_ID']
 API_KEY = os.environ['API_KEY']
 NEXT_QUEUE = os.environ['NEXT_QUEUE']
+STT_API_URL = os.environ.get('STT_API_URL', 'https://stt.api.cloud.yandex.net')
+OPERATION_API_URL = os.environ.get('OPERATION_API_URL', 'https://operation.api.cloud.yandex.net')
 
-def start_recognition(object_name):
-    object_url = f"https://storage.yandexcloud.net/{BUCKET_NAME}/{object_name}"
-    api_url = 'https://stt.api.cloud.yandex.net/stt/v3/recognizeFileAsync'
+RECOGNITION_WORKERS = 8
+
+def start_recognition(object_name, audio_format=None):
+    # requests нужен только для запросов к SpeechKit, не для пустых батчей и отложенных сообщений
+    import requests
+
+    object_url = f"{runtime.S3_ENDPOINT}/{BUCKET_NAME}/{object_name}"
+    api_url = f'{STT_API_URL}/stt/v3/recognizeFileAsync'
     params = {
         "uri": object_url,
         "recognitionModel": {
             "model": "general",
-            "audioFormat": {
-                "containerAudio": {
-                    "containerAudioType": "MP3"
-                }
-            },
+            # формат, в котором extract_audio записал файл; в старых сообщениях его нет — MP3
+            "audioFormat": audio.recognition_format(audio_format),
             "textNormalization": {
                 "textNormalization": "TEXT_NORMALIZATION_ENABLED",
                 "profanityFilter": False,
@@ -41,11 +46,7 @@ def start_recognition(object_name):
             "modelUri": f"gpt://{FOLDER_ID}/yandexgpt/rc",
             "properties": [
             {
-                "instruction": """У тебя есть текст транскрипта лекции. 
-                Сделай по нему подробный конспект, соблюдая следующие правила: 
-                1. Конспект должен быть структурирован: разделы, подпункты.
-                2. Выделяй ключевые идеи, важные факты и определения.
-                3. Если есть примеры или пояснения, укажи их кратко в скобках""",
+                "instruction": summarize.SUMMARY_INSTRUCTION,
                 "jsonObject": True,
             }
             ]
@@ -58,23 +59,49 @@ def start_recognition(object_name):
     }
 
     response = requests.post(api_url, headers=headers, json=params)
+    if response.status_code == 429:
+        raise ratelimit.RateLimited(ratelimit.retry_after(response))
     response.raise_for_status()
     result = response.json()
     return result.get('id')
 
-def json_to_text(data, level=0):
-    lines = []
-    indent = "  " * level
-    for k, v in data.items():
-        lines.append(f"{indent}{k}:")
-        if isinstance(v, dict):
-            lines.append(json_to_text(v, level + 1))
-        else:
-            lines.append(f"{indent}  {v}")
-    return "\n".join(lines)
+def get_operation(operation_id):
+    # дешёвая проверка статуса: результат целиком скачиваем, только когда операция завершена
+    import requests
+
+    url = f"{OPERATION_API_URL}/operations/{operation_id}"
+
+    headers = {
+        "Authorization": f"Api-key {API_KEY}",
+    }
+
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+def processing_time(operation):
+    created_at = parse_timestamp(operation.get('createdAt'))
+    modified_at = parse_timestamp(operation.get('modifiedAt'))
+    if created_at is None or modified_at is None:
+        return None
+    return modified_at - created_at
 
 def check_recognition(operation_id):
-    url = f"https://stt.api.cloud.yandex.net/stt/v3/getRecognition"
+    import requests
+
+    operation = get_operation(operation_id)
+    if not operation.get('done', False):
+        return {"done": False}
+    if operation.get('error'):
+        raise RuntimeError(f"Recognition failed: {operation['error']}")
+
+    url = f"{STT_API_URL}/stt/v3/getRecognition"
 
     params = {
         "operationId": operation_id
@@ -85,90 +112,241 @@ def check_recognition(operation_id):
         "x-folder-id": FOLDER_ID
     }
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        if not response.content:
+    # результат приходит потоком JSON-строк, конспект — в последней;
+    # весь поток сохраняется как транскрипт, чтобы конспект можно было пересобрать без SpeechKit
+    lines = []
+    with requests.get(url, headers=headers, params=params, stream=True, timeout=60) as response:
+        if response.status_code == 404:
             return {"done": False}
-        
-        result = json.loads(response.text.splitlines()[-1])
-        summary_str = result["result"]["summarization"]["results"][0]["response"]
-        summary_json = json.loads(summary_str)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                lines.append(line)
 
-        return {"done":True, 'text': json_to_text(summary_json)}
+    if not lines:
+        return {"done": False}
 
-    except requests.HTTPError as e:
-        if response.status_code == 404:
-            return {"done": False}
-        else:
-            raise
+    result = json.loads(lines[-1])
+    summary_str = result["result"]["summarization"]["results"][0]["response"]
+    summary_json = json.loads(summary_str)
+
+    return {"done": True, 'summary': summary_json, 'lines': lines, 'elapsed': processing_time(operation)}
 
 def send_message_to_queue(message, queue, delay, delay_bool):
-    s3_client = boto3.client(
-        service_name='sqs',
-        endpoint_url='https://message-queue.api.cloud.yandex.net',
-        region_name='ru-central1',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
+    sqs = runtime.sqs()
 
     if delay_bool:
-        s3_client.send_message(
+        sqs.send_message(
             QueueUrl=queue,
             MessageBody=json.dumps(message),
             DelaySeconds=int(min(delay, 15 * 60))
         )
     else:
-        s3_client.send_message(
+        sqs.send_message(
             QueueUrl=queue,
             MessageBody=json.dumps(message),
         )
 
-def save_text(text, id):
-    object_name = f"tmp/raw_text/{id}"
-    s3 = boto3.client(
-        service_name='s3',
-        endpoint_url="https://storage.yandexcloud.net",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    )
+def save_summary(summary, id):
+    # generate_pdf рендерит структуру конспекта сам, поэтому передаём JSON, а не плоский текст
+    object_name = artifacts.summary_key(id)
+    artifacts.put_json(object_name, summary)
+    return object_name
 
-    file_obj = io.BytesIO(text.encode('utf-8'))
+def format_offset(seconds):
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}"
 
-    s3.upload_fileobj(
-        file_obj,
-        BUCKET_NAME,
-        object_name,
-        ExtraArgs={'ContentType': 'text/plain'}
-    )
+def segment_label(segment):
+    start = segment['start']
+    return f"{format_offset(start)}–{format_offset(start + segment['duration'])}"
 
-    return object_name
+def save_partial(id, index, result):
+    artifacts.put_lines(artifacts.transcript_key(id, index), result['lines'])
+    artifacts.put_json(artifacts.part_key(id, index), result['summary'])
 
-def parse_duration(duration_str):
-    h, m, s = duration_str.split(":")
-    return int(h) * 3600 + int(m) * 60 + float(s)
+def load_partial(id, index):
+    key = artifacts.part_key(id, index)
+    if artifacts.exists(key):
+        return artifacts.get_json(key)
+    # части, сохранённые до появления artifacts/
+    resp = runtime.s3().get_object(Bucket=BUCKET_NAME, Key=f"tmp/summary/{id}/{index:03d}.json")
+    return json.loads(resp["Body"].read())
 
-def handler(event, context):
-    message = json.loads(event['messages'][0]['details']['message']['body'])
+def resummarize(message):
+    # пересборка конспекта из сохранённых транскриптов, без повторного распознавания
     id = message['id']
-    object_name = message['object_name']
-    operation_id = message.get('operation_id')
+    labels = artifacts.get_json(artifacts.segments_key(id))
+
+    def summarize_part(index):
+        text = summarize.transcript_text(artifacts.get_lines(artifacts.transcript_key(id, index)))
+        part = summarize.summarize_transcript(text)
+        artifacts.put_json(artifacts.part_key(id, index), part)
+        return part
 
-    duration = parse_duration(message.get('duration'))
-    delay = duration // 6 + 30
+    with tracing.span(id, 'recognize_audio', 'llm.summary'):
+        with ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS) as executor:
+            parts = list(executor.map(summarize_part, range(len(labels))))
 
-    if not operation_id:
-        operation_id = start_recognition(object_name)
-        message['operation_id'] = operation_id
+    with tracing.span(id, 'recognize_audio', 'llm.merge'):
+        summary = summarize.merge(parts, labels)
+    return summary
 
-    result = check_recognition(operation_id)
-    if not result.get('done', False):
-        send_message_to_queue(message, CUR_QUEUE, delay, True)
-        return {"statusCode": 200, "message": "Recognition pending"}
+def get_segments(message, duration):
+    # сообщения без segments — короткая лекция или отправленные до нарезки
+    segments = message.get('segments')
+    if segments:
+        return segments
+    return [{'object_name': message['object_name'], 'start': 0, 'duration': duration}]
 
-    text = result['text']
-    object_name = save_text(text, id)
-    message = {'id': id, 'object_name': object_name}
+def get_operations(message, segments, state):
+    operations = message.get('operations')
+    if operations:
+        return operations
+
+    if message.get('operation_id'):
+        return [{'id': message.pop('operation_id'), 'done': False, 'started_at': time.time()}]
+
+    # исходное сообщение доставлено повторно, а распознавание уже запущено — второй раз не запускаем
+    if state.get('operations'):
+        return state['operations']
+
+    # новые распознавания — только в пределах общей квоты SpeechKit, иначе сообщение откладывается
+    delay = ratelimit.acquire('stt', message['id'], message.get('tenant'), len(segments))
+    if delay:
+        raise ratelimit.RateLimited(delay)
+    return [{'id': None, 'done': False} for _ in segments]
+
+def try_start(object_name, audio_format):
+    # (id операции, ошибка): 429 — не ошибка, часть просто ждёт следующей попытки
+    try:
+        return start_recognition(object_name, audio_format), None
+    except ratelimit.RateLimited:
+        return None, None
+    except Exception as e:
+        return None, e
+
+def start_operations(segments, operations, indexes, audio_format=None):
+    # части, которым SpeechKit ответил 429, остаются без id и запускаются при следующей попытке;
+    # ошибка одной части не теряет id уже запущенных — она возвращается, чтобы её подняли после сохранения
+    with ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS) as executor:
+        results = list(executor.map(
+            lambda index: try_start(segments[index]['object_name'], audio_format),
+            indexes
+        ))
+    started_at = time.time()
+    errors = []
+    for index, (operation_id, error) in zip(indexes, results):
+        operations[index].update(id=operation_id, started_at=started_at)
+        if error is not None:
+            errors.append(error)
+    return errors[0] if errors else None
+
+def next_delay(operations, segments, now):
+    # следующий опрос — к ближайшему ожидаемому завершению среди незаконченных частей
+    delays = [
+        eta.next_delay(operation, segments[index]['duration'], now)
+        if operation['id'] is not None else ratelimit.DEFER_DELAY
+        for index, operation in enumerate(operations)
+        if not operation['done']
+    ]
+    return min(delays)
+
+def recognize(message):
+    id = message['id']
+
+    # повторная доставка после того, как конспект уже отправлен дальше
+    state = checkpoint.load(id, 'recognize_audio')
+    if checkpoint.is_done(state):
+        return
+
+    duration = envelope.duration_seconds(message) or 0
+    segments = get_segments(message, duration)
+
+    operations = get_operations(message, segments, state)
+    message['operations'] = operations
+
+    unstarted = [index for index, operation in enumerate(operations) if operation['id'] is None]
+    if unstarted:
+        with tracing.span(id, 'recognize_audio', 'stt.start'):
+            error = start_operations(segments, operations, unstarted, message.get('audio_format'))
+        # id операций запоминаются сразу, до отправки следующего опроса
+        state['operations'] = operations
+        checkpoint.save(id, 'recognize_audio', state)
+        if error is not None:
+            # повторная доставка возьмёт запущенные части из контрольной точки и запустит только остальные
+            raise error
+
+    # части, запущенные прошлыми доставками, опрашиваются и тогда, когда остальным достался 429;
+    # только что запущенные опрашивать бессмысленно
+    pending = [
+        index for index, operation in enumerate(operations)
+        if operation['id'] and not operation['done'] and index not in unstarted
+    ]
+
+    results = []
+    if pending:
+        with tracing.span(id, 'recognize_audio', 'stt.poll'):
+            with ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS) as executor:
+                results = list(executor.map(check_recognition, [operations[index]['id'] for index in pending]))
+
+    summaries = {}
+    now = time.time()
+    for index, result in zip(pending, results):
+        if result.get('done', False):
+            summaries[index] = result['summary']
+            operations[index]['done'] = True
+            # транскрипт и конспект части сохраняются сразу: на них опирается пересборка конспекта
+            save_partial(id, index, result)
+            elapsed = result.get('elapsed') or now - operations[index].get('started_at', now)
+            # очередь и работа SpeechKit над частью, от запуска до завершения операции
+            tracing.record(id, 'recognize_audio', 'stt.recognition', operations[index].get('started_at', now), elapsed)
+            eta.record(operations[index]['id'], segments[index]['duration'], elapsed)
+
+    if not all(operation['done'] for operation in operations):
+        # ожидание результата — не неудачная попытка, forward сбрасывает счётчик attempt
+        send_message_to_queue(envelope.forward(message, 'recognize_audio'), CUR_QUEUE, next_delay(operations, segments, now), True)
+        return
+
+    # распознавание закончено — место в квоте SpeechKit освобождается для других лекций
+    ratelimit.release(id, 'stt')
+
+    missing = [index for index in range(len(operations)) if index not in summaries]
+    with ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS) as executor:
+        for index, summary in zip(missing, executor.map(lambda index: load_partial(id, index), missing)):
+            summaries[index] = summary
+
+    # части объединяются строго по порядку следования в лекции
+    labels = [segment_label(segment) for segment in segments]
+    artifacts.put_json(artifacts.segments_key(id), labels)
+    with tracing.span(id, 'recognize_audio', 'llm.merge'):
+        summary = summarize.merge([summaries[index] for index in range(len(operations))], labels)
+
+    object_name = save_summary(summary, id)
+    message = envelope.forward(message, 'recognize_audio', drop=('operations', 'segments'), object_name=object_name)
     send_message_to_queue(message, NEXT_QUEUE, 0, False)
+    checkpoint.complete(id, 'recognize_audio', state)
 
-    return {"message": "ok", 'statusCode': 200}   
\ No newline at end of file
+def process_message(message):
+    message = envelope.receive(message, 'recognize_audio')
+    id = message['id']
+
+    try:
+        if message.get('regenerate') == 'summary':
+            object_name = save_summary(resummarize(message), id)
+            # regenerate остаётся в сообщении: generate_pdf не пропустит его как повтор
+            message = envelope.forward(message, 'recognize_audio', object_name=object_name)
+            send_message_to_queue(message, NEXT_QUEUE, 0, False)
+            return
+        recognize(message)
+    except ratelimit.RateLimited as e:
+        # квота исчерпана — не ошибка: сообщение возвращается в очередь с задержкой, попытка не тратится
+        send_message_to_queue(envelope.forward(message, 'recognize_audio'), CUR_QUEUE, e.delay, True)
+
+def handler(event, context):
+    try:
+        return batch.process_batch(event, process_message, 'recognize_audio')
+    finally:
+        # наблюдения для прогноза завершения — одним запросом на батч
+        eta.flush()
\ No newline at end of file
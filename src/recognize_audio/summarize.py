@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common import ratelimit
+
+FOLDER_ID = os.environ['FOLDER_ID']
+API_KEY = os.environ['API_KEY']
+LLM_API_URL = os.environ.get('LLM_API_URL', 'https://llm.api.cloud.yandex.net')
+
+# сколько символов частичных конспектов отправляем в одном запросе на объединение
+MAX_MERGE_CHARS = 24000
+# сколько символов транскрипта отправляем в одном запросе при пересборке конспекта
+MAX_TRANSCRIPT_CHARS = 24000
+MERGE_WORKERS = 4
+MERGE_TIMEOUT = 120
+LLM_ATTEMPTS = 3
+
+SUMMARY_INSTRUCTION = """У тебя есть текст транскрипта лекции. 
+                Сделай по нему подробный конспект, соблюдая следующие правила: 
+                1. Конспект должен быть структурирован: разделы, подпункты.
+                2. Выделяй ключевые идеи, важные факты и определения.
+                3. Если есть примеры или пояснения, укажи их кратко в скобках"""
+
+MERGE_INSTRUCTION = """Тебе даны конспекты последовательных частей одной лекции в формате JSON, в порядке следования.
+Объедини их в один подробный конспект, соблюдая следующие правила:
+1. Конспект должен быть структурирован: разделы, подпункты.
+2. Сохраняй порядок изложения, одинаковые разделы из соседних частей объединяй.
+3. Не теряй ключевые идеи, важные факты и определения.
+Ответь только JSON-объектом."""
+
+
+def complete(instruction, text):
+    import requests
+
+    headers = {
+        "Authorization": f"Api-key {API_KEY}",
+        "x-folder-id": FOLDER_ID
+    }
+    params = {
+        "modelUri": f"gpt://{FOLDER_ID}/yandexgpt/rc",
+        # нулевая температура — чтобы повторный запуск давал тот же конспект
+        "completionOptions": {"stream": False, "temperature": 0, "maxTokens": "8000"},
+        "jsonObject": True,
+        "messages": [
+            {"role": "system", "text": instruction},
+            {"role": "user", "text": text},
+        ],
+    }
+    for attempt in range(LLM_ATTEMPTS):
+        ratelimit.wait('llm')
+        response = requests.post(f"{LLM_API_URL}/foundationModels/v1/completion", headers=headers, json=params, timeout=MERGE_TIMEOUT)
+        if response.status_code == 429:
+            delay = ratelimit.retry_after(response)
+            if attempt + 1 == LLM_ATTEMPTS or delay > ratelimit.MAX_WAIT:
+                raise ratelimit.RateLimited(delay)
+            time.sleep(delay)
+            continue
+        response.raise_for_status()
+        return response.json()['result']['alternatives'][0]['message']['text']
+
+
+def parse_json(text):
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.strip('`')
+        if text.startswith('json'):
+            text = text[len('json'):]
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Summary is not a JSON object")
+    return data
+
+
+def transcript_text(lines):
+    # в потоке getRecognition каждая фраза приходит как final, а после нормализации — как finalRefinement
+    finals, refined = [], []
+    for line in lines:
+        result = json.loads(line).get('result', {})
+        if 'finalRefinement' in result:
+            alternatives = result['finalRefinement'].get('normalizedText', {}).get('alternatives', [])
+            refined.extend(alternative['text'] for alternative in alternatives[:1])
+        elif 'final' in result:
+            alternatives = result['final'].get('alternatives', [])
+            finals.extend(alternative['text'] for alternative in alternatives[:1])
+    return ' '.join(text for text in (refined or finals) if text)
+
+
+def chunks(text):
+    # режем по границам фраз, чтобы кусок транскрипта помещался в один запрос
+    pieces, current = [], ''
+    for sentence in text.split('. '):
+        if current and len(current) + len(sentence) > MAX_TRANSCRIPT_CHARS:
+            pieces.append(current)
+            current = ''
+        current = f"{current}. {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def summarize_transcript(text):
+    if not text:
+        return {}
+    pieces = chunks(text)
+    with ThreadPoolExecutor(max_workers=MERGE_WORKERS) as executor:
+        parts = list(executor.map(lambda piece: parse_json(complete(SUMMARY_INSTRUCTION, piece)), pieces))
+    return merge(parts, [f"{index + 1}" for index in range(len(parts))])
+
+
+def concat(parts, labels):
+    return {label: part for label, part in zip(labels, parts)}
+
+
+def group(parts, labels):
+    # соседние части упаковываются в группы, помещающиеся в один запрос
+    groups = []
+    current, size = [], 0
+    for part, label in zip(parts, labels):
+        length = len(json.dumps(part, ensure_ascii=False))
+        if current and size + length > MAX_MERGE_CHARS:
+            groups.append(current)
+            current, size = [], 0
+        current.append((part, label))
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+def merge_group(items):
+    parts = [part for part, _ in items]
+    labels = [label for _, label in items]
+    if len(parts) == 1:
+        return parts[0]
+
+    text = "\n\n".join(
+        f"{label}:\n{json.dumps(part, ensure_ascii=False)}"
+        for part, label in items
+    )
+    # ошибки запроса и квота пробрасываются: сообщение обработается повторно, а не получит склейку
+    answer = complete(MERGE_INSTRUCTION, text)
+    try:
+        return parse_json(answer)
+    except (json.JSONDecodeError, ValueError, KeyError):
+        # модель ответила не JSON-объектом — конспекты частей просто идут подряд
+        return concat(parts, labels)
+
+
+def merge(parts, labels):
+    if not parts:
+        return {}
+
+    while len(parts) > 1:
+        groups = group(parts, labels)
+        if len(groups) == len(parts):
+            # каждая часть сама по себе больше лимита, объединять моделью нечего
+            return concat(parts, labels)
+
+        with ThreadPoolExecutor(max_workers=MERGE_WORKERS) as executor:
+            parts = list(executor.map(merge_group, groups))
+        labels = [
+            items[0][1] if len(items) == 1 else f"{items[0][1]} — {items[-1][1]}"
+            for items in groups
+        ]
+
+    return parts[0]
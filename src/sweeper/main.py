@@ -0,0 +1,137 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from common import runtime, layout
+
+# Чистильщик промежуточных файлов: по таймеру удаляет tmp/ заданий с итоговым статусом.
+# PDF и artifacts/ не трогает — на PDF ссылаются задания-дубли из dedup, из artifacts/
+# собираются конспект и PDF по /regenerate. Задания, так и не дошедшие до итога,
+# остаются правилу жизненного цикла бакета.
+
+BUCKET_NAME = os.environ['BUCKET_NAME']
+TABLE_NAME = os.environ['TABLE_NAME']
+
+TERMINAL = ('успешно', 'ошибка')
+# опоздавшая повторная доставка ещё может дописывать в tmp/ только что завершённого задания
+GRACE = timedelta(minutes=int(os.environ.get('SWEEP_GRACE_MINUTES', '60')))
+
+# DeleteObjects принимает не больше 1000 ключей за запрос
+DELETE_BATCH = 1000
+STATUS_BATCH = 500
+
+
+def list_prefixes(prefix):
+    paginator = runtime.s3().get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix, Delimiter='/'):
+        for item in page.get('CommonPrefixes', []):
+            yield item['Prefix']
+
+
+def list_objects(prefix):
+    paginator = runtime.s3().get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        for item in page.get('Contents', []):
+            yield item['Key'], item['Size']
+
+
+def parse_task_id(name):
+    # tmp/<день>/<id>/ или старое tmp/video/<id>.mp4
+    try:
+        return str(uuid.UUID(name.split('/')[0].split('.')[0]))
+    except ValueError:
+        return None
+
+
+def finished(task_ids):
+    # id заданий, чьи промежуточные файлы больше никому не нужны
+    import ydb
+
+    task_ids = list(task_ids)
+    deadline = datetime.now(timezone.utc) - GRACE
+    result = set()
+    for start in range(0, len(task_ids), STATUS_BATCH):
+        query = f"""
+            SELECT id, status, updated_at
+            FROM `{TABLE_NAME}`
+            WHERE id IN $ids;
+        """
+        params = {
+            '$ids': (
+                [uuid.UUID(task_id) for task_id in task_ids[start:start + STATUS_BATCH]],
+                ydb.ListType(ydb.PrimitiveType.UUID),
+            ),
+        }
+        for result_set in runtime.execute(query, params):
+            for row in result_set.rows:
+                updated_at = row['updated_at']
+                if updated_at is not None and updated_at.tzinfo is None:
+                    updated_at = updated_at.replace(tzinfo=timezone.utc)
+                if row['status'] in TERMINAL and updated_at is not None and updated_at < deadline:
+                    result.add(str(row['id']))
+    return result
+
+
+def delete(objects, report, dry_run=False):
+    for start in range(0, len(objects), DELETE_BATCH):
+        batch = objects[start:start + DELETE_BATCH]
+        sizes = dict(batch)
+        failed = set()
+        if not dry_run:
+            response = runtime.s3().delete_objects(
+                Bucket=BUCKET_NAME,
+                Delete={'Objects': [{'Key': key} for key, _ in batch], 'Quiet': True},
+            )
+            # в тихом режиме ответ перечисляет только ключи, которые не удалось удалить
+            failed = {error['Key'] for error in response.get('Errors', [])}
+        report['objects'] += len(batch) - len(failed)
+        report['bytes'] += sum(size for key, size in sizes.items() if key not in failed)
+        report['errors'] += len(failed)
+
+
+def sweep_shard(shard, report, dry_run=False):
+    # в шарде дня задания видны одним списком с разделителем, объекты читаются только у завершённых
+    prefixes = {parse_task_id(prefix[len(shard):]): prefix for prefix in list_prefixes(shard)}
+    prefixes.pop(None, None)
+    done = finished(prefixes)
+    for task_id in done:
+        delete(list(list_objects(prefixes[task_id])), report, dry_run)
+    return done, set(prefixes) - done
+
+
+def sweep_legacy(prefix, report, dry_run=False):
+    # старая раскладка tmp/<вид>/<id>... без дня: объекты приходится перечислить целиком
+    objects = {}
+    for key, size in list_objects(prefix):
+        task_id = parse_task_id(key[len(prefix):])
+        if task_id is not None:
+            objects.setdefault(task_id, []).append((key, size))
+    done = finished(objects)
+    for task_id in done:
+        delete(objects[task_id], report, dry_run)
+    return done, set(objects) - done
+
+
+def sweep(dry_run=False):
+    started = time.perf_counter()
+    report = {'shards': 0, 'objects': 0, 'bytes': 0, 'errors': 0, 'dry_run': dry_run}
+    # задание старой раскладки может лежать сразу в нескольких tmp/<вид>/
+    swept, kept = set(), set()
+    for shard in list_prefixes(layout.TMP_ROOT):
+        sweep_prefix = sweep_legacy if shard in layout.LEGACY_TMP_PREFIXES else sweep_shard
+        done, waiting = sweep_prefix(shard, report, dry_run)
+        swept |= done
+        kept |= waiting
+        report['shards'] += 1
+    report['tasks'] = len(swept)
+    report['kept'] = len(kept)
+    report['elapsed'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def handler(event, context):
+    # ручной вызов с {"dry_run": true} только считает, сколько было бы удалено
+    report = sweep(dry_run=bool((event or {}).get('dry_run')))
+    print(json.dumps(report))
+    return {'statusCode': 200, 'body': json.dumps(report)}
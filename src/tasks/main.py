@@ -1,24 +1,58 @@
 import os
 import json
-import ydb
-import boto3
+import uuid
+import base64
+import calendar
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from common import runtime
 
 BUCKET_NAME = os.environ['BUCKET_NAME']
-YDB_ENDPOINT = os.environ['YDB_ENDPOINT']
-YDB_DATABASE = os.environ['YDB_DATABASE']
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
 TABLE_NAME = os.environ['TABLE_NAME']
+TASK_SPANS_TABLE = os.environ['TASK_SPANS_TABLE']
 
-def generate_presigned_pdf_url(pdf_key: str, name:str, expires_in=600):
-    s3 = boto3.client(
-        service_name='s3',
-        endpoint_url='https://storage.yandexcloud.net',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    )
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_NAME_FILTER = 200
+
+# изменения из параллельных транзакций могут закоммититься с отметкой чуть раньше уже отданной,
+# поэтому дельта захватывает и несколько секунд до неё; клиент повторы просто перезаписывает
+DELTA_OVERLAP = 5 * 1_000_000
+MAX_DELTA_SIZE = 200
+
+PRESIGNED_URL_TTL = 600
+# ссылку отдаём из кэша, только если ей осталось жить больше этого запаса
+PRESIGNED_URL_MARGIN = 120
+MAX_CACHED_URLS = 10000
+
+# индексы таблицы заданий, см. terraform/main.tf
+CREATED_AT_INDEX = 'idx_created_at'
+STATUS_INDEX = 'idx_status_created_at'
+UPDATED_AT_INDEX = 'idx_updated_at'
+SPANS_INDEX = 'idx_started_at'
+
+# окно и корзины гистограммы замеров этапов (верхние границы, в секундах)
+DEFAULT_STATS_HOURS = 24
+MAX_STATS_HOURS = 24 * 7
+HISTOGRAM_BUCKETS = [0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600]
+
+# (pdf_key, name) -> (url, expires_at), живёт между вызовами в тёплом контейнере
+_presigned_urls = {}
+
+class BadRequest(Exception):
+    pass
+
+class NotFound(Exception):
+    pass
 
-    return s3.generate_presigned_url(
+def generate_presigned_pdf_url(pdf_key: str, name:str, expires_in=PRESIGNED_URL_TTL):
+    now = time.time()
+    cached = _presigned_urls.get((pdf_key, name))
+    if cached is not None and cached[1] - PRESIGNED_URL_MARGIN > now:
+        return cached[0]
+
+    url = runtime.s3().generate_presigned_url(
         ClientMethod='get_object',
         Params={
             'Bucket': BUCKET_NAME,
@@ -28,48 +62,336 @@ def generate_presigned_pdf_url(pdf_key: str, name:str, expires_in=600):
         ExpiresIn=expires_in
     )
 
-def get_tasks():
-    driver_config = ydb.DriverConfig(
-        endpoint=YDB_ENDPOINT,
-        database=YDB_DATABASE,
-        credentials=ydb.credentials_from_env_variables()
-    )
-    with ydb.Driver(driver_config) as driver:
-        driver.wait(fail_fast=True, timeout=5)
-
-        query = f"""
-            SELECT id, name, created_at, url, status, pdf, error
-            FROM `{TABLE_NAME}`
-            ORDER BY created_at DESC;
-        """
-
-        with ydb.QuerySessionPool(driver) as pool:
-            result_sets = pool.execute_with_retries(query)
-            tasks = []
-            for row in result_sets[0].rows:
-                pdf_key = row.get("pdf")
-                pdf_url = None
-                name = row.get("name", "lecture")
-                if pdf_key:
-                    pdf_url = generate_presigned_pdf_url(pdf_key, name)
-                tasks.append({
-                    "id": str(row["id"]),
-                    "name": name,
-                    "url": row.get("url", ""),
-                    "created_at": str(row.get("created_at", "")),
-                    "status": row.get("status", ""),
-                    "pdf": pdf_url,
-                    "error": row.get("error", "")
-                })
-            return tasks
+    if len(_presigned_urls) >= MAX_CACHED_URLS:
+        for key, (_, expires_at) in list(_presigned_urls.items()):
+            if expires_at - PRESIGNED_URL_MARGIN <= now:
+                del _presigned_urls[key]
+        if len(_presigned_urls) >= MAX_CACHED_URLS:
+            _presigned_urls.clear()
+
+    _presigned_urls[(pdf_key, name)] = (url, now + expires_in)
+    return url
+
+def to_micros(created_at):
+    if isinstance(created_at, int):
+        return created_at
+    return calendar.timegm(created_at.utctimetuple()) * 1_000_000 + created_at.microsecond
+
+def encode_cursor(created_at, task_id):
+    raw = json.dumps([to_micros(created_at), str(task_id)])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(created_at), uuid.UUID(task_id)
+    except Exception:
+        raise BadRequest("Некорректный курсор")
+
+def parse_watermark(value):
+    try:
+        watermark = int(value)
+    except ValueError:
+        raise BadRequest("Некорректная отметка изменений")
+    if watermark < 0:
+        raise BadRequest("Некорректная отметка изменений")
+    return watermark
+
+def parse_page_size(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest("Некорректный размер страницы")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def get_tasks(limit=DEFAULT_PAGE_SIZE, cursor=None, status=None, name=None):
+    import ydb
+
+    conditions = []
+    params = {
+        '$limit': (limit + 1, ydb.PrimitiveType.Uint64),
+    }
+
+    if status:
+        index = STATUS_INDEX
+        conditions.append("status = $status")
+        params['$status'] = (status, ydb.PrimitiveType.Utf8)
+    else:
+        index = CREATED_AT_INDEX
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        conditions.append("(created_at < $cursor_created_at OR (created_at = $cursor_created_at AND id < $cursor_id))")
+        params['$cursor_created_at'] = (cursor_created_at, ydb.PrimitiveType.Timestamp)
+        params['$cursor_id'] = (cursor_id, ydb.PrimitiveType.UUID)
+
+    if name:
+        conditions.append("String::Contains(Unicode::ToLower(name), $name)")
+        params['$name'] = (name.lower()[:MAX_NAME_FILTER], ydb.PrimitiveType.Utf8)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # отметка последнего изменения — с неё страница дальше запрашивает только дельты
+    query = f"""
+        SELECT id, name, created_at, url, status, pdf, error
+        FROM `{TABLE_NAME}` VIEW {index}
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT $limit;
+
+        SELECT updated_at
+        FROM `{TABLE_NAME}` VIEW {UPDATED_AT_INDEX}
+        ORDER BY updated_at DESC
+        LIMIT 1;
+    """
+
+    result_sets = runtime.execute(query, params)
+    rows = result_sets[0].rows
+    latest = result_sets[1].rows
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    watermark = to_micros(latest[0]["updated_at"]) if latest and latest[0]["updated_at"] else 0
+    # любое изменение таблицы сдвигает отметку, поэтому по ней и числу строк страница сверяется без сборки ответа
+    return [watermark, len(rows)], lambda: {
+        "tasks": serialize_tasks(rows),
+        "next_cursor": next_cursor,
+        "watermark": str(watermark),
+    }
+
+def get_changes(since):
+    import ydb
+
+    # читаются только строки, изменённые после отметки, — объём зависит от частоты изменений, а не от размера таблицы
+    query = f"""
+        SELECT id, name, created_at, url, status, pdf, error, updated_at
+        FROM `{TABLE_NAME}` VIEW {UPDATED_AT_INDEX}
+        WHERE updated_at > $since
+        ORDER BY updated_at, id
+        LIMIT $limit;
+    """
+    params = {
+        '$since': (max(0, since - DELTA_OVERLAP), ydb.PrimitiveType.Timestamp),
+        '$limit': (MAX_DELTA_SIZE + 1, ydb.PrimitiveType.Uint64),
+    }
+
+    rows = runtime.execute(query, params)[0].rows
+    if len(rows) > MAX_DELTA_SIZE:
+        # изменений больше, чем стоит досылать, — страница перечитает список целиком
+        return [since, None], lambda: {"tasks": [], "watermark": str(since), "reset": True}
+
+    watermark = max([since] + [to_micros(row["updated_at"]) for row in rows])
+    return [watermark, len(rows)], lambda: {"tasks": serialize_tasks(rows), "watermark": str(watermark), "reset": False}
+
+def serialize_tasks(rows):
+    tasks = []
+    for row in rows:
+        pdf_key = row.get("pdf")
+        pdf_url = None
+        name = row.get("name", "lecture")
+        if pdf_key:
+            pdf_url = generate_presigned_pdf_url(pdf_key, name)
+        tasks.append({
+            "id": str(row["id"]),
+            "name": name,
+            "url": row.get("url", ""),
+            "created_at": str(row.get("created_at", "")),
+            "status": row.get("status", ""),
+            "pdf": pdf_url,
+            "error": row.get("error", "")
+        })
+    return tasks
+
+def parse_task_id(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise BadRequest("Некорректный идентификатор задания")
+
+def parse_hours(value):
+    if value in (None, ''):
+        return DEFAULT_STATS_HOURS
+    try:
+        hours = int(value)
+    except ValueError:
+        raise BadRequest("Некорректное окно статистики")
+    return max(1, min(hours, MAX_STATS_HOURS))
+
+def get_task(task_id):
+    import ydb
+
+    query = f"""
+        SELECT id, name, created_at, url, status, pdf, error, updated_at
+        FROM `{TABLE_NAME}`
+        WHERE id = $id;
+
+        SELECT stage, name, started_at, duration, bytes
+        FROM `{TASK_SPANS_TABLE}`
+        WHERE task_id = $id
+        ORDER BY started_at;
+    """
+    params = {
+        '$id': (task_id, ydb.PrimitiveType.UUID),
+    }
+
+    task_rows, span_rows = runtime.execute(query, params)[:2]
+    if not task_rows.rows:
+        raise NotFound("Задание не найдено")
+
+    # замеры только дописываются, поэтому хватает их числа
+    task = task_rows.rows[0]
+    updated_at = to_micros(task["updated_at"]) if task["updated_at"] else 0
+    return [updated_at, len(span_rows.rows)], lambda: task_body(task, span_rows.rows)
+
+def task_body(task, span_rows):
+    spans = []
+    # суммарное время и объём по каждому этапу и виду замера
+    totals = {}
+    for row in span_rows:
+        spans.append({
+            "stage": row["stage"],
+            "name": row["name"],
+            "started_at": str(row["started_at"]),
+            "duration": round(row["duration"], 3),
+            "bytes": row["bytes"],
+        })
+        total = totals.setdefault(row["stage"], {}).setdefault(row["name"], {"count": 0, "duration": 0.0, "bytes": 0})
+        total["count"] += 1
+        total["duration"] = round(total["duration"] + row["duration"], 3)
+        total["bytes"] += row["bytes"] or 0
+
+    return {"task": serialize_tasks([task])[0], "spans": spans, "totals": totals}
+
+def get_span_stats(hours=DEFAULT_STATS_HOURS):
+    import ydb
+
+    bucket_cases = " ".join(f"WHEN $d <= {bound} THEN {float(bound)}" for bound in HISTOGRAM_BUCKETS)
+    query = f"""
+        $bucket = ($d) -> {{ RETURN CASE {bucket_cases} ELSE NULL END; }};
+
+        SELECT
+            stage,
+            name,
+            COUNT(*) AS count,
+            PERCENTILE(duration, 0.5) AS p50,
+            PERCENTILE(duration, 0.95) AS p95,
+            MAX(duration) AS max,
+            SUM(bytes) AS bytes
+        FROM `{TASK_SPANS_TABLE}` VIEW {SPANS_INDEX}
+        WHERE started_at >= $since
+        GROUP BY stage, name
+        ORDER BY stage, name;
+
+        SELECT stage, name, le, COUNT(*) AS count
+        FROM `{TASK_SPANS_TABLE}` VIEW {SPANS_INDEX}
+        WHERE started_at >= $since
+        GROUP BY stage, name, $bucket(duration) AS le;
+    """
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    params = {
+        '$since': (since, ydb.PrimitiveType.Timestamp),
+    }
+
+    summary_rows, bucket_rows = runtime.execute(query, params)[:2]
+
+    histograms = {}
+    for row in bucket_rows.rows:
+        histograms.setdefault((row["stage"], row["name"]), {})[row["le"]] = row["count"]
+
+    stats = []
+    for row in summary_rows.rows:
+        counts = histograms.get((row["stage"], row["name"]), {})
+        stats.append({
+            "stage": row["stage"],
+            "name": row["name"],
+            "count": row["count"],
+            "p50": round(row["p50"], 3),
+            "p95": round(row["p95"], 3),
+            "max": round(row["max"], 3),
+            "bytes": row["bytes"],
+            # le = null — всё, что дольше последней границы
+            "histogram": [
+                {"le": le, "count": counts.get(le, 0)}
+                for le in [float(bound) for bound in HISTOGRAM_BUCKETS] + [None]
+            ],
+        })
+
+    return {"since": since.isoformat(), "hours": hours, "stats": stats}
+
+def if_none_match(event):
+    headers = event.get("headers") or {}
+    value = next((v for k, v in headers.items() if k.lower() == "if-none-match"), "")
+    return {tag.strip() for tag in value.split(",") if tag.strip()}
+
+def make_etag(query, validator):
+    # ссылки на PDF в ответе берутся из кэша и обновляются не реже раза за этот период
+    period = int(time.time() // (PRESIGNED_URL_TTL - PRESIGNED_URL_MARGIN))
+    raw = json.dumps([sorted(query.items()), validator, period], default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+def not_modified(etag):
+    return {
+        "statusCode": 304,
+        "headers": {"ETag": etag, "Cache-Control": "no-cache"},
+        "body": ""
+    }
+
+def json_response(build, event, validator=None):
+    # с validator ETag считается до сборки ответа: на совпавший If-None-Match
+    # не нужно ни подписывать ссылки, ни сериализовать список
+    if validator is not None:
+        etag = make_etag(event.get("queryStringParameters") or {}, validator)
+        if etag in if_none_match(event):
+            return not_modified(etag)
+    body = json.dumps(build(), ensure_ascii=False)
+    if validator is None:
+        etag = '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+        if etag in if_none_match(event):
+            return not_modified(etag)
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json", "ETag": etag, "Cache-Control": "no-cache"},
+        "body": body
+    }
 
 def handler(event, context):
+    query = event.get("queryStringParameters") or {}
+
     try:
-        tasks = get_tasks()
+        if query.get("id"):
+            validator, build = get_task(parse_task_id(query["id"]))
+        elif query.get("view") == "stats":
+            # у сводки нет отметки изменения — ETag считается по готовому ответу
+            stats = get_span_stats(parse_hours(query.get("hours")))
+            return json_response(lambda: stats, event)
+        elif query.get("since"):
+            validator, build = get_changes(parse_watermark(query["since"]))
+        else:
+            validator, build = get_tasks(
+                limit=parse_page_size(query.get("limit")),
+                cursor=query.get("cursor") or None,
+                status=(query.get("status") or "").strip() or None,
+                name=(query.get("name") or "").strip() or None,
+            )
+        return json_response(build, event, validator)
+    except BadRequest as e:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": str(e)}, ensure_ascii=False)
+        }
+    except NotFound as e:
         return {
-            "statusCode": 200,
+            "statusCode": 404,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"tasks": tasks}, ensure_ascii=False)
+            "body": json.dumps({"error": str(e)}, ensure_ascii=False)
         }
     except Exception as e:
-        return {'statusCode': 500, 'message': str(e)}
\ No newline at end of file
+        return {'statusCode': 500, 'message': str(e)}
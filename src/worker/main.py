@@ -0,0 +1,159 @@
+# Локальный режим: все этапы конвейера в одном долгоживущем воркере на своей машине, без облачных
+# функций и Message Queue. Обработчики — те же main.handler функций, сообщения — в том же формате,
+# очереди — файл SQLite (common/localqueue.py). YDB и Object Storage задаются теми же переменными
+# окружения, что в terraform/main.tf (для офлайн-прогона — локальная YDB и S3_ENDPOINT на moto или MinIO).
+#
+# Запуск:
+#   python src/worker/main.py run [--processes N] [--threads N]
+#   python src/worker/main.py submit lectures.csv   # тот же CSV/JSON, что у POST /bulk
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+from common import audio, localqueue, runtime, stages
+
+# сообщения в батче, как batch_size триггеров
+BATCH_SIZE = 10
+REPORT_SECONDS = 30
+JOIN_TIMEOUT = 30
+
+
+def downstream(function):
+    # этап не берёт новых сообщений, пока следующая очередь переполнена;
+    # собственная очередь (повторы, опрос SpeechKit) и DLQ не в счёт, иначе этап мог бы заблокировать сам себя
+    if function == 'download_lecture':
+        return ['recognize' if audio.env_flag('FUSED_MODE') else 'extract']
+    if function == 'extract_audio':
+        return ['recognize']
+    if function == 'recognize_audio':
+        return ['generate']
+    return []
+
+
+def cpu_stages():
+    # ffmpeg и reportlab, остальные этапы ждут сеть в пуле потоков;
+    # в совмещённом режиме ffmpeg запускает download_lecture, а extract_audio простаивает
+    if audio.env_flag('FUSED_MODE'):
+        return ['download_lecture', 'generate_pdf']
+    return ['extract_audio', 'generate_pdf']
+
+
+def cpu_shares(processes):
+    # --processes — процессы на все ядра сразу: делятся между этапами поровну, остаток — кодированию
+    names = cpu_stages()
+    base, extra = divmod(max(processes, len(names)), len(names))
+    return {name: base + (index < extra) for index, name in enumerate(names)}
+
+
+def backlog(sqs, queue):
+    attributes = sqs.get_queue_attributes(QueueUrl=localqueue.url(queue))['Attributes']
+    return int(attributes['ApproximateNumberOfMessages'])
+
+
+def serve(function, queue, queue_env, batch_size, threads, queue_limit, stop):
+    os.environ['BATCH_WORKERS'] = str(threads)
+    # Ctrl+C получает главный процесс, этапы останавливаются через stop после текущего батча
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    module = stages.load_function(function, {key: localqueue.url(name) for key, name in queue_env.items()})
+    sqs = runtime.sqs()
+    stages.serve(
+        module, sqs, localqueue.url(queue), batch_size, stop,
+        paused=lambda: any(backlog(sqs, name) >= queue_limit for name in downstream(function)),
+    )
+
+
+def report(sqs):
+    depths = []
+    for _, queue, _ in stages.STAGES:
+        attributes = sqs.get_queue_attributes(QueueUrl=localqueue.url(queue))['Attributes']
+        waiting = int(attributes['ApproximateNumberOfMessages']) + int(attributes['ApproximateNumberOfMessagesDelayed'])
+        depths.append(f"{queue} {waiting}/{attributes['ApproximateNumberOfMessagesNotVisible']}")
+    print(time.strftime('%H:%M:%S'), 'ждут/в работе:', ', '.join(depths), flush=True)
+
+
+def run(args):
+    sqs = runtime.sqs()
+    # сообщения, взятые процессами прошлого запуска, возвращаются в очередь сразу
+    sqs.release()
+
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    workers = []
+    shares = cpu_shares(args.processes)
+    for function, queue, queue_env in stages.STAGES:
+        if function in shares:
+            # в каждом процессе по одному сообщению за раз
+            count, batch_size, threads = shares[function], 1, 1
+        else:
+            # ввод-вывод: один процесс, сообщения батча — в пуле потоков common/batch.py
+            count, batch_size, threads = 1, BATCH_SIZE, args.threads
+        for _ in range(count):
+            worker = context.Process(
+                target=serve,
+                args=(function, queue, queue_env, batch_size, threads, args.queue_limit, stop),
+                name=function,
+            )
+            worker.start()
+            workers.append(worker)
+    print(f"воркер запущен: {len(workers)} процессов, очереди в {os.environ['LOCAL_QUEUE_PATH']}", flush=True)
+
+    # systemd и docker останавливают воркер SIGTERM — так же, как Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while all(worker.is_alive() for worker in workers):
+            report(sqs)
+            time.sleep(REPORT_SECONDS)
+        print("процесс этапа завершился, воркер останавливается", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(JOIN_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+
+
+def submit(args):
+    # задания создаются тем же кодом, что POST /bulk, и встают в локальную очередь download
+    create = stages.load_function('create')
+    with open(args.file, encoding='utf-8') as f:
+        items = create.parse_lectures(f.read(), 'json' if args.file.endswith('.json') else 'csv')
+    print(json.dumps(create.create_bulk(items), ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queue-path', default=os.environ.get('LOCAL_QUEUE_PATH', 'queues.sqlite3'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='процессов на все этапы с ffmpeg и рендерингом PDF, делятся между ними')
+    run_parser.add_argument('--threads', type=int, default=10, help='потоков на этап ввода-вывода')
+    run_parser.add_argument('--queue-limit', type=int, default=None,
+                            help='сколько сообщений может ждать в следующей очереди, прежде чем этап притормозит')
+
+    submit_parser = commands.add_parser('submit')
+    submit_parser.add_argument('file')
+    args = parser.parse_args()
+
+    # окружение наследуют процессы этапов; адреса очередей — для create и главного процесса
+    os.environ['QUEUE_BACKEND'] = 'local'
+    os.environ['LOCAL_QUEUE_PATH'] = os.path.abspath(args.queue_path)
+    for key, name in {'QUEUE': 'download', 'RECOGNIZE_QUEUE': 'recognize', 'GENERATE_QUEUE': 'generate'}.items():
+        os.environ[key] = localqueue.url(name)
+
+    if args.command == 'run':
+        if args.queue_limit is None:
+            args.queue_limit = 2 * args.processes
+        run(args)
+    else:
+        submit(args)
+
+
+if __name__ == '__main__':
+    main()
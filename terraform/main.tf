@@ -4,6 +4,12 @@ terraform {
       source = "yandex-cloud/yandex"
       version = "0.175.0"
     }
+    # src/<функция>/common — симлинк на src/common, начиная с 2.4.0
+    # archive_file по умолчанию проходит по симлинкам на директории
+    archive = {
+      source  = "hashicorp/archive"
+      version = ">= 2.4.0"
+    }
   }
 }
 
@@ -88,21 +94,345 @@ resource "yandex_ydb_table" "tasks_table" {
     type     = "Utf8"
     not_null = false
   }
+  column {
+    name     = "updated_at"
+    type     = "Timestamp"
+    not_null = false
+  }
   primary_key = ["id"]
 }
 
+# постраничная выдача списка заданий идёт по (created_at, id) через индексы,
+# покрывающие все колонки выдачи, поэтому обращения к основной таблице не нужны
+resource "yandex_ydb_table_index" "tasks_created_at_index" {
+  table_path        = yandex_ydb_table.tasks_table.path
+  connection_string = yandex_ydb_table.tasks_table.connection_string
+  name              = "idx_created_at"
+  type              = "global_sync"
+  columns           = ["created_at"]
+  cover             = ["name", "url", "status", "pdf", "error"]
+}
+
+resource "yandex_ydb_table_index" "tasks_status_index" {
+  table_path        = yandex_ydb_table.tasks_table.path
+  connection_string = yandex_ydb_table.tasks_table.connection_string
+  name              = "idx_status_created_at"
+  type              = "global_sync"
+  columns           = ["status", "created_at"]
+  cover             = ["name", "url", "pdf", "error"]
+}
+
+# дельты для страницы заданий: строки, изменённые после отметки времени
+resource "yandex_ydb_table_index" "tasks_updated_at_index" {
+  table_path        = yandex_ydb_table.tasks_table.path
+  connection_string = yandex_ydb_table.tasks_table.connection_string
+  name              = "idx_updated_at"
+  type              = "global_sync"
+  columns           = ["updated_at"]
+  cover             = ["name", "url", "created_at", "status", "pdf", "error"]
+}
+
+# индекс дедупликации: ключ содержимого файла на Диске -> задание, которое его обрабатывает
+resource "yandex_ydb_table" "lectures_table" {
+  path              = "${var.prefix}-lectures"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "key"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "task_id"
+    type     = "UUID"
+    not_null = true
+  }
+  column {
+    name     = "public_key"
+    type     = "Utf8"
+    not_null = false
+  }
+  column {
+    name     = "status"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "pdf"
+    type     = "Utf8"
+    not_null = false
+  }
+  column {
+    name     = "updated_at"
+    type     = "Timestamp"
+    not_null = false
+  }
+  primary_key = ["key"]
+}
+
+resource "yandex_ydb_table_index" "lectures_task_id_index" {
+  table_path        = yandex_ydb_table.lectures_table.path
+  connection_string = yandex_ydb_table.lectures_table.connection_string
+  name              = "idx_task_id"
+  type              = "global_sync"
+  columns           = ["task_id"]
+  cover             = ["status"]
+}
+
+# задания с той же лекцией, ждущие завершения задания-владельца
+resource "yandex_ydb_table" "lecture_waiters_table" {
+  path              = "${var.prefix}-lecture-waiters"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "key"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "task_id"
+    type     = "UUID"
+    not_null = true
+  }
+  column {
+    name     = "created_at"
+    type     = "Timestamp"
+    not_null = false
+  }
+  primary_key = ["key", "task_id"]
+}
+
+# история длительностей распознавания для прогноза следующего опроса SpeechKit
+resource "yandex_ydb_table" "recognition_stats_table" {
+  path              = "${var.prefix}-recognition-stats"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "finished_at"
+    type     = "Timestamp"
+    not_null = true
+  }
+  column {
+    name     = "operation_id"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "audio_seconds"
+    type     = "Double"
+    not_null = true
+  }
+  column {
+    name     = "elapsed_seconds"
+    type     = "Double"
+    not_null = true
+  }
+  primary_key = ["finished_at", "operation_id"]
+}
+
+# общий лимитер SpeechKit и YandexGPT: ведро токенов на каждый сервис
+resource "yandex_ydb_table" "rate_limits_table" {
+  path              = "${var.prefix}-rate-limits"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "name"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "tokens"
+    type     = "Double"
+    not_null = true
+  }
+  column {
+    name     = "refilled_at"
+    type     = "Timestamp"
+    not_null = true
+  }
+  primary_key = ["name"]
+}
+
+# аренды мест в квоте одновременных распознаваний, по одной на задание
+resource "yandex_ydb_table" "rate_leases_table" {
+  path              = "${var.prefix}-rate-leases"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "name"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "holder"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "tenant"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "weight"
+    type     = "Uint32"
+    not_null = true
+  }
+  column {
+    name     = "acquired_at"
+    type     = "Timestamp"
+  }
+  column {
+    name     = "expires_at"
+    type     = "Timestamp"
+    not_null = true
+  }
+  primary_key = ["name", "holder"]
+}
+
+# контрольные точки этапов для повторных доставок сообщений, хранятся неделю
+resource "yandex_ydb_table" "stage_checkpoints_table" {
+  path              = "${var.prefix}-stage-checkpoints"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "task_id"
+    type     = "UUID"
+    not_null = true
+  }
+  column {
+    name     = "stage"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name = "state"
+    type = "Json"
+  }
+  column {
+    name     = "updated_at"
+    type     = "Timestamp"
+    not_null = true
+  }
+  primary_key = ["task_id", "stage"]
+
+  ttl {
+    column_name     = "updated_at"
+    expire_interval = "P7D"
+  }
+}
+
+# журнал переходов статусов заданий, пишется батчами вместе с обновлением tasks
+resource "yandex_ydb_table" "task_events_table" {
+  path              = "${var.prefix}-task-events"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "id"
+    type     = "UUID"
+    not_null = true
+  }
+  column {
+    name     = "ts"
+    type     = "Timestamp"
+    not_null = true
+  }
+  column {
+    name     = "status"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name = "stage"
+    type = "Utf8"
+  }
+  column {
+    name = "error"
+    type = "Utf8"
+  }
+  column {
+    name = "pdf"
+    type = "Utf8"
+  }
+  primary_key = ["id", "ts", "status"]
+}
+
+# замеры этапов обработки по заданиям: ожидание в очереди, обработчик, внешние API
+resource "yandex_ydb_table" "task_spans_table" {
+  path              = "${var.prefix}-task-spans"
+  connection_string = yandex_ydb_database_serverless.ydb.ydb_full_endpoint
+
+  depends_on = [yandex_ydb_database_serverless.ydb]
+
+  column {
+    name     = "task_id"
+    type     = "UUID"
+    not_null = true
+  }
+  column {
+    name     = "started_at"
+    type     = "Timestamp"
+    not_null = true
+  }
+  column {
+    name     = "stage"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "name"
+    type     = "Utf8"
+    not_null = true
+  }
+  column {
+    name     = "duration"
+    type     = "Double"
+    not_null = true
+  }
+  column {
+    name = "bytes"
+    type = "Uint64"
+  }
+  primary_key = ["task_id", "started_at", "stage", "name"]
+}
+
+# гистограмма в /ydb?view=stats читает замеры за окно по времени
+resource "yandex_ydb_table_index" "task_spans_started_at_index" {
+  table_path        = yandex_ydb_table.task_spans_table.path
+  connection_string = yandex_ydb_table.task_spans_table.connection_string
+  name              = "idx_started_at"
+  type              = "global_async"
+  columns           = ["started_at"]
+  cover             = ["duration", "bytes"]
+}
+
 resource "yandex_storage_bucket" "bucket" {
   bucket     = "${var.prefix}-bucket"
   access_key = yandex_iam_service_account_static_access_key.sa_static_key.access_key
   secret_key = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
   depends_on = [yandex_resourcemanager_folder_iam_member.sa_roles]
 
+  # tmp/ завершённых заданий удаляет sweeper; правило — страховка для заданий, так и не дошедших до итога
   lifecycle_rule {
     id      = "clean"
     enabled = true
 
     expiration {
-      days = 1
+      days = 7
     }
     
     filter {
@@ -110,6 +440,14 @@ resource "yandex_storage_bucket" "bucket" {
     }
   }
 
+  # multipart-загрузки видео, брошенные без повторной доставки, не должны копиться
+  lifecycle_rule {
+    id      = "abort-uploads"
+    enabled = true
+
+    abort_incomplete_multipart_upload_days = 2
+  }
+
   force_destroy = true
 }
 
@@ -156,6 +494,13 @@ data "archive_file" "tasks_func_zip" {
 }
 
 resource "yandex_function" "tasks_func" {
+  depends_on = [
+    yandex_ydb_table_index.tasks_created_at_index,
+    yandex_ydb_table_index.tasks_status_index,
+    yandex_ydb_table_index.tasks_updated_at_index,
+    yandex_ydb_table_index.task_spans_started_at_index,
+  ]
+
   name               = "${var.prefix}-tasks"
   user_hash          = data.archive_file.tasks_func_zip.output_sha256
   runtime            = "python311"
@@ -169,6 +514,7 @@ resource "yandex_function" "tasks_func" {
     YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
     AWS_SECRET_ACCESS_KEY = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
@@ -189,6 +535,12 @@ resource "yandex_message_queue" "dlq" {
   depends_on = [yandex_resourcemanager_folder_iam_member.sa_roles]
 }
 
+data "yandex_message_queue" "dlq" {
+  name       = yandex_message_queue.dlq.name
+  access_key = yandex_iam_service_account_static_access_key.sa_static_key.access_key
+  secret_key = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
+}
+
 data "archive_file" "dlq_func_zip" {
   type        = "zip"
   output_path = "dlq_func.zip"
@@ -202,7 +554,7 @@ resource "yandex_function_trigger" "dlq_trigger" {
   message_queue {
     queue_id           = yandex_message_queue.dlq.arn
     batch_cutoff       = 2
-    batch_size         = 1
+    batch_size         = 10
     service_account_id = yandex_iam_service_account.sa.id
   }
 
@@ -223,9 +575,17 @@ resource "yandex_function" "dlq_func" {
   service_account_id = yandex_iam_service_account.sa.id
 
   environment = {
+    CUR_QUEUE = data.yandex_message_queue.dlq.url
+
     YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
+    TASK_EVENTS_TABLE = yandex_ydb_table.task_events_table.path
+    LECTURES_TABLE = yandex_ydb_table.lectures_table.path
+    LECTURE_WAITERS_TABLE = yandex_ydb_table.lecture_waiters_table.path
+    RATE_LIMITS_TABLE = yandex_ydb_table.rate_limits_table.path
+    RATE_LEASES_TABLE = yandex_ydb_table.rate_leases_table.path
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
     AWS_SECRET_ACCESS_KEY = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
@@ -236,6 +596,53 @@ resource "yandex_function" "dlq_func" {
   }
 }
 
+data "archive_file" "sweeper_zip" {
+  type        = "zip"
+  output_path = "sweeper.zip"
+  source_dir  = "../src/sweeper"
+}
+
+resource "yandex_function_trigger" "sweeper_trigger" {
+  name      = "${var.prefix}-sweeper"
+  folder_id = var.folder_id
+
+  timer {
+    cron_expression = "15 * ? * * *"
+  }
+
+  function {
+    id                 = yandex_function.sweeper_func.id
+    service_account_id = yandex_iam_service_account.sa.id
+  }
+}
+
+resource "yandex_function" "sweeper_func" {
+  name               = "${var.prefix}-sweeper"
+  user_hash          = data.archive_file.sweeper_zip.output_sha256
+  runtime            = "python311"
+  entrypoint         = "main.handler"
+  memory             = 256
+  execution_timeout  = 600
+  folder_id          = var.folder_id
+  service_account_id = yandex_iam_service_account.sa.id
+
+  environment = {
+    BUCKET_NAME = yandex_storage_bucket.bucket.bucket
+    SWEEP_GRACE_MINUTES = "60"
+
+    AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
+    AWS_SECRET_ACCESS_KEY = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
+
+    YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
+    YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
+    TABLE_NAME = yandex_ydb_table.tasks_table.path
+  }
+
+  content {
+    zip_filename = data.archive_file.sweeper_zip.output_path
+  }
+}
+
 data "archive_file" "create_zip" {
   type        = "zip"
   output_path = "create.zip"
@@ -258,7 +665,11 @@ resource "yandex_function" "create_func" {
     YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     QUEUE = data.yandex_message_queue.download_lecture_queue.url
+    RECOGNIZE_QUEUE = data.yandex_message_queue.recognize_audio_queue.url
+    GENERATE_QUEUE = data.yandex_message_queue.generate_pdf_queue.url
+    BUCKET_NAME = yandex_storage_bucket.bucket.bucket
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_EVENTS_TABLE = yandex_ydb_table.task_events_table.path
   }
 
   content {
@@ -292,7 +703,7 @@ resource "yandex_function_trigger" "download_lecture_trigger" {
   message_queue {
     queue_id           = yandex_message_queue.download_lecture_queue.arn
     batch_cutoff       = 2
-    batch_size         = 1
+    batch_size         = 10
     service_account_id = yandex_iam_service_account.sa.id
   }
 
@@ -308,17 +719,34 @@ data "archive_file" "download_lecture_zip" {
   source_dir  = "../src/download_lecture"
 }
 
+# с ffmpeg архив больше лимита прямой загрузки, поэтому в совмещённом режиме он кладётся в бакет
+resource "yandex_storage_object" "download_lecture_zip_object" {
+  count  = var.fused_mode ? 1 : 0
+  bucket = yandex_storage_bucket.bucket.bucket
+  key    = "download_lecture.zip"
+  source = data.archive_file.download_lecture_zip.output_path
+}
+
 resource "yandex_function" "download_lecture_func" {
   name               = "${var.prefix}-download-lecture"
   user_hash          = data.archive_file.download_lecture_zip.output_sha256
   runtime            = "python311"
   entrypoint         = "main.handler"
   memory             = 512
-  execution_timeout  = 60
+  execution_timeout  = 600
   folder_id          = var.folder_id
   service_account_id = yandex_iam_service_account.sa.id
 
   environment = {
+    CUR_QUEUE = data.yandex_message_queue.download_lecture_queue.url
+    DLQ = data.yandex_message_queue.dlq.url
+    # ffmpeg загружает процессор, как в extract_audio
+    BATCH_WORKERS = var.fused_mode ? "2" : "4"
+
+    # в памяти держится до BATCH_WORKERS * TRANSFER_CONCURRENCY частей
+    TRANSFER_PART_SIZE_MB = "8"
+    TRANSFER_CONCURRENCY = "4"
+
     BUCKET_NAME = yandex_storage_bucket.bucket.bucket
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
@@ -327,12 +755,35 @@ resource "yandex_function" "download_lecture_func" {
     YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
+    STAGE_CHECKPOINTS_TABLE = yandex_ydb_table.stage_checkpoints_table.path
+    TASK_EVENTS_TABLE = yandex_ydb_table.task_events_table.path
+    LECTURES_TABLE = yandex_ydb_table.lectures_table.path
+    LECTURE_WAITERS_TABLE = yandex_ydb_table.lecture_waiters_table.path
 
     QUEUE = data.yandex_message_queue.extract_audio_queue.url
+
+    FUSED_MODE = tostring(var.fused_mode)
+    RECOGNIZE_QUEUE = data.yandex_message_queue.recognize_audio_queue.url
+    SEGMENT_SECONDS = "1200"
+    AUDIO_PROFILE = var.audio_profile
+    AUDIO_TRIM_SILENCE = tostring(var.audio_trim_silence)
+    AUDIO_LOUDNORM = tostring(var.audio_loudnorm)
   }
 
-  content {
-    zip_filename = data.archive_file.download_lecture_zip.output_path
+  dynamic "content" {
+    for_each = var.fused_mode ? [] : [1]
+    content {
+      zip_filename = data.archive_file.download_lecture_zip.output_path
+    }
+  }
+
+  dynamic "package" {
+    for_each = var.fused_mode ? [1] : []
+    content {
+      bucket_name = yandex_storage_bucket.bucket.bucket
+      object_name = yandex_storage_object.download_lecture_zip_object[0].key
+    }
   }
 }
 
@@ -362,7 +813,7 @@ resource "yandex_function_trigger" "extract_audio_trigger" {
   message_queue {
     queue_id           = yandex_message_queue.extract_audio_queue.arn
     batch_cutoff       = 2
-    batch_size         = 1
+    batch_size         = 10
     service_account_id = yandex_iam_service_account.sa.id
   }
 
@@ -387,14 +838,22 @@ resource "yandex_storage_object" "extract_audio_zip_object" {
 resource "yandex_function" "extract_audio_func" {
   name               = "${var.prefix}-extract-audio"
   user_hash          = data.archive_file.extract_audio_zip.output_sha256
-  runtime            = "bash-2204"
-  entrypoint         = "main.sh"
+  runtime            = "python311"
+  entrypoint         = "main.handler"
   memory             = 512
-  execution_timeout  = 60
+  execution_timeout  = 600
   folder_id          = var.folder_id
   service_account_id = yandex_iam_service_account.sa.id
 
   environment = {
+    CUR_QUEUE = data.yandex_message_queue.extract_audio_queue.url
+    DLQ = data.yandex_message_queue.dlq.url
+    BATCH_WORKERS = "2"
+    SEGMENT_SECONDS = "1200"
+    AUDIO_PROFILE = var.audio_profile
+    AUDIO_TRIM_SILENCE = tostring(var.audio_trim_silence)
+    AUDIO_LOUDNORM = tostring(var.audio_loudnorm)
+
     QUEUE = data.yandex_message_queue.recognize_audio_queue.url
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
@@ -402,8 +861,11 @@ resource "yandex_function" "extract_audio_func" {
     
     BUCKET_NAME = yandex_storage_bucket.bucket.bucket
 
+    YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
+    STAGE_CHECKPOINTS_TABLE = yandex_ydb_table.stage_checkpoints_table.path
   }
 
   package {
@@ -438,7 +900,7 @@ resource "yandex_function_trigger" "recognize_audio_trigger" {
   message_queue {
     queue_id           = yandex_message_queue.recognize_audio_queue.arn
     batch_cutoff       = 2
-    batch_size         = 1
+    batch_size         = 10
     service_account_id = yandex_iam_service_account.sa.id
   }
 
@@ -460,16 +922,26 @@ resource "yandex_function" "recognize_audio_func" {
   runtime            = "python311"
   entrypoint         = "main.handler"
   memory             = 512
-  execution_timeout  = 60
+  execution_timeout  = 600
   folder_id          = var.folder_id
   service_account_id = yandex_iam_service_account.sa.id
 
   environment = {
+    DLQ = data.yandex_message_queue.dlq.url
+
     BUCKET_NAME = yandex_storage_bucket.bucket.bucket
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
     AWS_SECRET_ACCESS_KEY = yandex_iam_service_account_static_access_key.sa_static_key.secret_key
     
+    YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
+    YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
+    RECOGNITION_STATS_TABLE = yandex_ydb_table.recognition_stats_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
+    STAGE_CHECKPOINTS_TABLE = yandex_ydb_table.stage_checkpoints_table.path
+    RATE_LIMITS_TABLE = yandex_ydb_table.rate_limits_table.path
+    RATE_LEASES_TABLE = yandex_ydb_table.rate_leases_table.path
+
     FOLDER_ID = var.folder_id
     API_KEY = yandex_iam_service_account_api_key.sa_api_key.secret_key
 
@@ -508,7 +980,7 @@ resource "yandex_function_trigger" "generate_pdf_trigger" {
   message_queue {
     queue_id           = yandex_message_queue.generate_pdf_queue.arn
     batch_cutoff       = 2
-    batch_size         = 1
+    batch_size         = 10
     service_account_id = yandex_iam_service_account.sa.id
   }
 
@@ -530,11 +1002,15 @@ resource "yandex_function" "generate_pdf_func" {
   runtime            = "python311"
   entrypoint         = "main.handler"
   memory             = 512
-  execution_timeout  = 60
+  execution_timeout  = 600
   folder_id          = var.folder_id
   service_account_id = yandex_iam_service_account.sa.id
 
   environment = {
+    CUR_QUEUE = data.yandex_message_queue.generate_pdf_queue.url
+    DLQ = data.yandex_message_queue.dlq.url
+    BATCH_WORKERS = "4"
+
     BUCKET_NAME = yandex_storage_bucket.bucket.bucket
 
     AWS_ACCESS_KEY_ID = yandex_iam_service_account_static_access_key.sa_static_key.access_key
@@ -543,6 +1019,11 @@ resource "yandex_function" "generate_pdf_func" {
     YDB_ENDPOINT          = "grpcs://${yandex_ydb_database_serverless.ydb.ydb_api_endpoint}"
     YDB_DATABASE          = yandex_ydb_database_serverless.ydb.database_path
     TABLE_NAME = yandex_ydb_table.tasks_table.path
+    TASK_SPANS_TABLE = yandex_ydb_table.task_spans_table.path
+    STAGE_CHECKPOINTS_TABLE = yandex_ydb_table.stage_checkpoints_table.path
+    TASK_EVENTS_TABLE = yandex_ydb_table.task_events_table.path
+    LECTURES_TABLE = yandex_ydb_table.lectures_table.path
+    LECTURE_WAITERS_TABLE = yandex_ydb_table.lecture_waiters_table.path
   }
 
   content {
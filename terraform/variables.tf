@@ -11,4 +11,27 @@ variable "folder_id" {
 variable "prefix" {
   type = string
   description = "префикс ресурсов"
-}
\ No newline at end of file
+}
+variable "audio_profile" {
+  type = string
+  description = "профиль кодирования аудио для распознавания: mp3, opus16k или lpcm16k"
+  default = "opus16k"
+}
+
+variable "audio_trim_silence" {
+  type = bool
+  description = "сокращать длинные паузы перед распознаванием"
+  default = false
+}
+
+variable "audio_loudnorm" {
+  type = bool
+  description = "нормализовать громкость перед распознаванием"
+  default = false
+}
+
+variable "fused_mode" {
+  type = bool
+  description = "download_lecture сам извлекает аудио из видео на Диске, без копии видео в бакете и без extract_audio"
+  default = false
+}